@@ -0,0 +1,280 @@
+import functools
+import hashlib
+import re
+import threading
+import time
+import urllib
+
+from django import http
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.utils import translation
+from django.utils.cache import patch_vary_headers
+from django.utils.encoding import smart_str
+from django.utils.text import compress_string
+
+
+# Headers kept with a cached response; anything else is regenerated.
+CACHED_HEADERS = ('Content-Type', 'Content-Disposition', 'Cache-Control',
+                  'Expires', 'ETag', 'Last-Modified')
+
+re_accepts_gzip = re.compile(r'\bgzip\b')
+
+# Tag of every page cached by cache_anonymous_page.
+PAGES_TAG = 'pages'
+
+# Stands in for the visitor's CSRF token in cached pages.
+CSRF_TOKEN_MARKER = '__CSRF_TOKEN__'
+
+# Tags are invalidated by moving them to the next value of this counter,
+# so that a tag's generation tells whether it was invalidated after a
+# given point.
+TAG_CLOCK = 'tag_clock'
+
+_collected = threading.local()
+
+# Tag clock when each key was found missing by this thread, that is,
+# before its value started being computed.
+_misses = threading.local()
+MAX_REMEMBERED_MISSES = 1000
+
+
+def cache_response(key, response, timeout=None, tags=(), compress=True):
+    """Caches a response as plain data: its status, a minimal set of
+       headers and the body, as-is and, with `compress`, gzip-compressed.
+       The response is dropped when any of `tags` is invalidated."""
+    content = response.content
+    set_tagged(key, {
+        'status': response.status_code,
+        'headers': [(header, response[header]) for header in CACHED_HEADERS
+                    if response.has_header(header)],
+        'content': content,
+        'gzipped': compress_string(content) if compress else None,
+    }, tags, timeout)
+
+
+def cached_response(key, request):
+    """Rebuilds a response stored with cache_response, or returns None.
+       Clients accepting gzip get the compressed body as stored."""
+    data = get_tagged(key)
+    if data is None:
+        return None
+    accepts_gzip = re_accepts_gzip.search(
+        request.META.get('HTTP_ACCEPT_ENCODING', '')
+    )
+    if (accepts_gzip and data['gzipped'] and
+            len(data['gzipped']) < len(data['content'])):
+        response = http.HttpResponse(data['gzipped'], status=data['status'])
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = http.HttpResponse(data['content'], status=data['status'])
+    for header, value in data['headers']:
+        response[header] = value
+    response['Content-Length'] = str(len(response.content))
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def _generation_key(name):
+    return 'generation:%s' % name
+
+
+def get_generations(names):
+    """Returns the current generation of each of `names`, a number that
+       changes whenever bump_generation is called for the name."""
+    if not names:
+        return []
+    keys = [_generation_key(name) for name in names]
+    generations = cache.get_many(keys)
+    missing = [key for key in keys if key not in generations]
+    if missing:
+        # Start from the time rather than 0, so that a generation lost
+        # from the cache never comes back to a value used before.
+        start = int(time.time() * 1000)
+        for key in missing:
+            cache.add(key, start, settings.CACHE_GENERATION_TIMEOUT)
+        generations.update(cache.get_many(missing))
+    return [generations.get(key) for key in keys]
+
+
+def bump_generation(name):
+    """Moves `name` to a new generation, invalidating everything cached
+       against the old one.  Returns the new generation."""
+    key = _generation_key(name)
+    try:
+        generation = cache.incr(key)
+    except ValueError:
+        generation = None
+    if generation is None:
+        generation = int(time.time() * 1000)
+        cache.set(key, generation, settings.CACHE_GENERATION_TIMEOUT)
+    return generation
+
+
+def _tag_generation(tag):
+    return 'tag:%s' % tag
+
+
+def _tag_clock():
+    return get_generations([TAG_CLOCK])[0]
+
+
+def _tag_generations(tags):
+    """The generations of `tags`.  A missing generation starts at the
+       current value of the tag clock: no tag was invalidated since any
+       value cached with that value, as that would have moved the clock."""
+    keys = [_generation_key(_tag_generation(tag)) for tag in tags]
+    if not keys:
+        return []
+    generations = cache.get_many(keys)
+    missing = [key for key in keys if key not in generations]
+    if missing:
+        clock = _tag_clock()
+        for key in missing:
+            cache.add(key, clock, settings.CACHE_GENERATION_TIMEOUT)
+        generations.update(cache.get_many(missing))
+    return [generations.get(key) for key in keys]
+
+
+def _remember_miss(key):
+    started = getattr(_misses, 'started', None)
+    if started is None or len(started) >= MAX_REMEMBERED_MISSES:
+        # Misses never followed by set_tagged, such as pages that could
+        # not be cached, are forgotten eventually.
+        started = _misses.started = {}
+    started[key] = _tag_clock()
+
+
+def _forget_miss(key):
+    started = getattr(_misses, 'started', None)
+    if started is None:
+        return None
+    return started.pop(key, None)
+
+
+def set_tagged(key, value, tags, timeout=None):
+    """Caches `value` as depending on `tags`, e.g. 'event:42'.  Once any
+       of the tags is invalidated, get_tagged no longer returns it.
+
+       When get_tagged found the key missing in this thread, the value is
+       not cached if any of the tags was invalidated since then, as it
+       may have been computed from data older than the invalidation."""
+    tags = sorted(set(tags))
+    started = _forget_miss(key)
+    generations = _tag_generations(tags)
+    add_tags(*tags)
+    if started is not None and any(generation > started
+                                   for generation in generations):
+        return
+    cache.set(key, (tags, generations, value), timeout)
+
+
+def get_tagged(key):
+    """Returns a value cached with set_tagged, or None if it is missing
+       or any of its tags was invalidated since."""
+    entry = cache.get(key)
+    if entry is None:
+        _remember_miss(key)
+        return None
+    tags, generations, value = entry
+    if _tag_generations(tags) != generations:
+        _remember_miss(key)
+        return None
+    add_tags(*tags)
+    return value
+
+
+def object_tag(model, pk):
+    """Cache tag of a single object, e.g. 'event:42'."""
+    return '%s:%s' % (model._meta.module_name, pk)
+
+
+def invalidate_tags(*tags):
+    """Invalidates every value cached with any of `tags`, at the cost of
+       one increment and one write; the stale entries expire by
+       themselves."""
+    tags = set(tags)
+    if not tags:
+        return
+    clock = bump_generation(TAG_CLOCK)
+    cache.set_many(dict((_generation_key(_tag_generation(tag)), clock)
+                        for tag in tags), settings.CACHE_GENERATION_TIMEOUT)
+
+
+def add_tags(*tags):
+    """Adds tags to the page being cached, if any.  Tagged values read or
+       cached while a page renders add their tags by themselves."""
+    collected = getattr(_collected, 'tags', None)
+    if collected is not None:
+        collected.update(tags)
+
+
+def skip_page_cache():
+    """Keeps the page being rendered out of the cache, for pages showing
+       something that depends on the visitor or the time."""
+    if getattr(_collected, 'tags', None) is not None:
+        _collected.skip = True
+
+
+def _csrf_token(request):
+    return getattr(request, 'csrf_token', None) or get_token(request)
+
+
+def cache_anonymous_page(*tags, **kwargs):
+    """Caches a view's pages for anonymous GET requests, by host, path,
+       language and the query parameters named in `params`; the view
+       must ignore any other.  A cached page is dropped when any of
+       `tags` or of the tagged values used to render it is invalidated.
+       The visitor's CSRF token is kept out of the cached HTML and put
+       back on each hit."""
+    params = sorted(kwargs.pop('params', ()))
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD') or
+                    request.user.is_authenticated()):
+                return view(request, *args, **kwargs)
+            query = urllib.urlencode([(param, smart_str(request.GET[param]))
+                                      for param in params
+                                      if param in request.GET])
+            key = 'page:%s' % hashlib.md5(smart_str('|'.join((
+                request.is_secure() and 'https' or 'http',
+                request.get_host(),
+                request.path,
+                query,
+                translation.get_language() or '',
+            )))).hexdigest()
+            token = smart_str(_csrf_token(request) or '')
+            response = cached_response(key, request)
+            if response is not None:
+                if token:
+                    response.content = response.content.replace(
+                        CSRF_TOKEN_MARKER, token
+                    )
+                    response['Content-Length'] = str(len(response.content))
+            else:
+                _collected.tags = set(tags)
+                _collected.skip = False
+                try:
+                    response = view(request, *args, **kwargs)
+                    page_tags = _collected.tags
+                    skip = _collected.skip
+                finally:
+                    _collected.tags = None
+                if (skip or response.status_code != 200 or
+                        response.cookies):
+                    return response
+                content = response.content
+                if token:
+                    content = content.replace(token, CSRF_TOKEN_MARKER)
+                page_tags.add(PAGES_TAG)
+                # Not compressed, as the token goes back in on every hit.
+                cache_response(key, http.HttpResponse(
+                    content, content_type=response['Content-Type']
+                ), settings.PAGE_CACHE_TIMEOUT, page_tags, compress=False)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,49 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import translation
+from django.utils.encoding import smart_str
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+
+def fragment_cache_key(key):
+    """Cache key of a template fragment; `key` may be any value with a
+       stable repr, e.g. ('home_event', event.id, event.modified)."""
+    return 'fragment:%s' % hashlib.md5(smart_str(repr(
+        (key, translation.get_language())
+    ))).hexdigest()
+
+
+class FragmentCacheExtension(Extension):
+    """Caches the rendered content of a block in the Django cache:
+
+        {% cache ('home_event', event.id, event.modified), 3600 %}
+          ...
+        {% endcache %}
+
+       The timeout is optional and defaults to FRAGMENT_CACHE_TIMEOUT.
+       Fragments are cached per language."""
+    tags = set(['cache'])
+
+    def parse(self, parser):
+        lineno = parser.stream.next().lineno
+        args = [parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cache', args),
+                               [], [], body).set_lineno(lineno)
+
+    def _cache(self, key, timeout, caller):
+        key = fragment_cache_key(key)
+        content = cache.get(key)
+        if content is None:
+            content = caller()
+            cache.set(key, content,
+                      timeout or settings.FRAGMENT_CACHE_TIMEOUT)
+        return content
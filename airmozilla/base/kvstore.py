@@ -0,0 +1,92 @@
+"""sorl-thumbnail key value store with buffered database writes.
+
+sorl's cached_db store writes every key to the database as it is set,
+which costs a few queries per thumbnail generated by a page.  This store
+keeps the writes of a request in memory (memcached is updated right away)
+and writes them in bulk when KVStoreFlushMiddleware sees the response.
+Outside of requests, in commands and threads, it writes through."""
+import threading
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+
+_buffer = threading.local()
+
+
+def _writes():
+    return getattr(_buffer, 'writes', None)
+
+
+class KVStore(CachedDBKVStore):
+    """The cached_db store, writing behind while a request is served and
+       able to read many keys at once."""
+
+    def begin(self):
+        """Starts buffering the writes of this thread."""
+        _buffer.writes = {}
+
+    def flush(self):
+        """Writes the buffered keys in bulk and stops buffering."""
+        writes = _writes()
+        _buffer.writes = None
+        if not writes:
+            return
+        rows = [KVStoreModel(key=key, value=value)
+                for key, value in writes.iteritems()]
+        try:
+            with transaction.commit_on_success():
+                # Replacing the existing rows rather than updating them one
+                # by one keeps the number of queries constant.
+                KVStoreModel.objects.filter(key__in=writes.keys()).delete()
+                KVStoreModel.objects.bulk_create(rows)
+        except IntegrityError:
+            # Another process created some of them meanwhile.
+            for kv in rows:
+                super(KVStore, self)._set_raw(kv.key, kv.value)
+
+    def _get_raw(self, key):
+        writes = _writes()
+        if writes is not None and key in writes:
+            return writes[key]
+        return super(KVStore, self)._get_raw(key)
+
+    def _get_many_raw(self, keys):
+        """Values for many keys, None for the missing ones, with one
+           cache.get_many() and one query for the cache misses."""
+        writes = _writes() or {}
+        values = dict((key, writes[key]) for key in keys if key in writes)
+        pending = [key for key in keys if key not in writes]
+        if pending:
+            values.update(cache.get_many(pending))
+        missing = [key for key in pending if key not in values]
+        if missing:
+            stored = dict(KVStoreModel.objects.filter(key__in=missing)
+                          .values_list('key', 'value'))
+            # Misses are cached too, like _get_raw() does.
+            fetched = dict((key, stored.get(key, EMPTY_VALUE))
+                           for key in missing)
+            cache.set_many(fetched, settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(fetched)
+        return dict((key, None if values[key] == EMPTY_VALUE else values[key])
+                    for key in keys)
+
+    def _set_raw(self, key, value):
+        writes = _writes()
+        if writes is None:
+            return super(KVStore, self)._set_raw(key, value)
+        writes[key] = value
+        cache.set(key, value, settings.THUMBNAIL_CACHE_TIMEOUT)
+
+    def _delete_raw(self, *keys):
+        writes = _writes()
+        if writes is not None:
+            for key in keys:
+                writes.pop(key, None)
+        super(KVStore, self)._delete_raw(*keys)
@@ -0,0 +1,22 @@
+from sorl.thumbnail import default
+
+
+class KVStoreFlushMiddleware(object):
+    """Buffers the thumbnail key value store writes of a request and
+       writes them in bulk once the response is ready."""
+
+    def _flush(self):
+        if hasattr(default.kvstore, 'flush'):
+            default.kvstore.flush()
+
+    def process_request(self, request):
+        if hasattr(default.kvstore, 'begin'):
+            default.kvstore.begin()
+
+    def process_response(self, request, response):
+        self._flush()
+        return response
+
+    def process_exception(self, request, exception):
+        # The thumbnails written so far exist all the same.
+        self._flush()
@@ -0,0 +1,42 @@
+from django.db import models
+
+from airmozilla.base.cache import bump_generation
+
+
+# Tables whose generation is kept up to date, see track_changes().
+_tracked_tables = set()
+
+
+def table_generation(db_table):
+    """Name of the generation bumped whenever rows of db_table change."""
+    return 'table:%s' % db_table
+
+
+def is_tracked(db_table):
+    return db_table in _tracked_tables
+
+
+def bump_table_generation(sender, **kwargs):
+    bump_generation(table_generation(sender._meta.db_table))
+
+
+def bump_m2m_generation(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_generation(table_generation(sender._meta.db_table))
+
+
+def track_changes(*tracked):
+    """Bumps the table generation of the given models, and of their many
+       to many tables, whenever they change, so that counts over them can
+       be cached.  Only these models pay for the extra cache write."""
+    for model in tracked:
+        models.signals.post_save.connect(bump_table_generation,
+                                         sender=model)
+        models.signals.post_delete.connect(bump_table_generation,
+                                           sender=model)
+        _tracked_tables.add(model._meta.db_table)
+        for field in model._meta.many_to_many:
+            through = field.rel.through
+            models.signals.m2m_changed.connect(bump_m2m_generation,
+                                               sender=through)
+            _tracked_tables.add(through._meta.db_table)
@@ -8,6 +8,11 @@ $(function() {
         var parsed = moment(datetime);
         $element.text(parsed.format(format));
     });
+    $('time.jsnow').each(function(i, time) {
+        // The current time, which pages cannot carry as they are cached.
+        var $element = $(time);
+        $element.text(moment().format($element.attr('data-format')));
+    });
     $.timeago.settings.allowFuture = true;
     $('time.timeago').timeago();
 
@@ -0,0 +1,47 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from nose.tools import eq_, ok_
+
+from airmozilla.base.cache import get_tagged, invalidate_tags, set_tagged
+
+
+class TestTaggedCache(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidate(self):
+        """Invalidating any tag of a value drops it; others are kept."""
+        set_tagged('both', 'value', ['event:1', 'events:public'])
+        set_tagged('other', 'value', ['event:2'])
+        eq_(get_tagged('both'), 'value')
+        invalidate_tags('event:1')
+        ok_(get_tagged('both') is None)
+        eq_(get_tagged('other'), 'value')
+        set_tagged('both', 'new value', ['event:1', 'events:public'])
+        eq_(get_tagged('both'), 'new value')
+
+    def test_lost_generation(self):
+        """A value is not served if its tag generations were lost after
+           any tag was invalidated, since the lost one may have been."""
+        set_tagged('key', 'value', ['event:1'])
+        invalidate_tags('event:2')
+        cache.delete('generation:tag:event:1')
+        ok_(get_tagged('key') is None)
+
+    def test_invalidated_while_computing(self):
+        """A value computed from data older than an invalidation of one
+           of its tags is not cached."""
+        ok_(get_tagged('key') is None)
+        # Another process saves the event while the value is computed.
+        invalidate_tags('event:1')
+        set_tagged('key', 'stale', ['event:1'])
+        ok_(get_tagged('key') is None)
+        set_tagged('key', 'fresh', ['event:1'])
+        eq_(get_tagged('key'), 'fresh')
+
+    def test_untagged(self):
+        set_tagged('key', 'value', [])
+        eq_(get_tagged('key'), 'value')
+        ok_(get_tagged('missing') is None)
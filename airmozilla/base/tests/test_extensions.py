@@ -0,0 +1,28 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from jingo import env
+from nose.tools import eq_
+
+
+class TestFragmentCache(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_by_key(self):
+        """Fragments are rendered once per key."""
+        template = env.from_string(
+            '{% cache ("fragment", id), 60 %}{{ value }}{% endcache %}|'
+            '{{ value }}'
+        )
+        eq_(template.render({'id': 1, 'value': 'a'}), 'a|a')
+        eq_(template.render({'id': 1, 'value': 'b'}), 'a|b')
+        eq_(template.render({'id': 2, 'value': 'b'}), 'b|b')
+
+    def test_default_timeout(self):
+        template = env.from_string(
+            '{% cache "key" %}{{ value }}{% endcache %}'
+        )
+        eq_(template.render({'value': 'a'}), 'a')
+        eq_(template.render({'value': 'b'}), 'a')
@@ -0,0 +1,62 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from nose.tools import eq_, ok_
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from airmozilla.base.kvstore import KVStore
+
+
+class TestKVStore(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.kvstore = KVStore()
+
+    def tearDown(self):
+        self.kvstore.flush()
+
+    def _flush_queries(self, existing):
+        self.kvstore.begin()
+        with self.assertNumQueries(0):
+            for i in range(10):
+                self.kvstore._set_raw('key%d' % i, 'value%d' % i)
+            eq_(self.kvstore._get_raw('key3'), 'value3')
+        for i in range(existing):
+            KVStoreModel.objects.create(key='key%d' % i, value='old')
+        with self.assertNumQueries(3):
+            self.kvstore.flush()
+        eq_(dict(KVStoreModel.objects.filter(key__startswith='key')
+                 .values_list('key', 'value')),
+            dict(('key%d' % i, 'value%d' % i) for i in range(10)))
+
+    def test_write_behind(self):
+        """Writes made while buffering reach the database on flush, with
+           as many queries however many keys already exist."""
+        for existing in (1, 5, 10):
+            self._flush_queries(existing)
+            KVStoreModel.objects.all().delete()
+
+    def test_write_through(self):
+        """Without a request, writes go to the database right away."""
+        self.kvstore._set_raw('key', 'value')
+        eq_(KVStoreModel.objects.get(key='key').value, 'value')
+
+    def test_delete_buffered(self):
+        self.kvstore.begin()
+        self.kvstore._set_raw('key', 'value')
+        self.kvstore._delete_raw('key')
+        self.kvstore.flush()
+        ok_(not KVStoreModel.objects.filter(key='key').exists())
+
+    def test_get_many(self):
+        """Many keys are read with one query, and then from the cache."""
+        KVStoreModel.objects.create(key='stored', value='value')
+        self.kvstore.begin()
+        self.kvstore._set_raw('buffered', 'new value')
+        expected = {'stored': 'value', 'buffered': 'new value',
+                    'missing': None}
+        with self.assertNumQueries(1):
+            eq_(self.kvstore._get_many_raw(expected.keys()), expected)
+        with self.assertNumQueries(0):
+            eq_(self.kvstore._get_many_raw(expected.keys()), expected)
@@ -0,0 +1,49 @@
+from cStringIO import StringIO
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from nose.tools import eq_
+
+try:
+    from PIL import Image
+except ImportError:
+    import Image
+
+from airmozilla.base.thumbnail_engine import Engine, draft_size
+
+
+def _jpeg(size):
+    buf = StringIO()
+    Image.new('RGB', size, (200, 100, 50)).save(buf, format='JPEG')
+    buf.seek(0)
+    return Image.open(buf)
+
+
+class TestThumbnailEngine(TestCase):
+
+    options = {'crop': False, 'upscale': False, 'colorspace': 'RGB',
+               'orientation': False}
+
+    def test_draft_size(self):
+        eq_(draft_size((4000, 3000), (160, 160), False), (160, 120))
+        eq_(draft_size((4000, 3000), (160, 160), 'center'), (213, 160))
+        eq_(draft_size((4000, 2000), (68, 68), 'center'), (136, 68))
+        eq_(draft_size((100, 50), (160, 160), False), (100, 50))
+
+    def test_decoded_reduced(self):
+        """A large JPEG is decoded at a fraction of its size."""
+        image = _jpeg((2400, 1600))
+        thumbnail = Engine().create(image, (68, 68), self.options)
+        eq_(thumbnail.size, (68, 45))
+        eq_(image.size, (300, 200))
+
+    def test_crop(self):
+        image = _jpeg((2400, 1600))
+        options = dict(self.options, crop='center')
+        eq_(Engine().create(image, (68, 68), options).size, (68, 68))
+
+    def test_too_large(self):
+        with override_settings(THUMBNAIL_MAX_PIXELS=1000):
+            self.assertRaises(IOError, Engine().create, _jpeg((400, 300)),
+                              (160, 160), self.options)
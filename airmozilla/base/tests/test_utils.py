@@ -0,0 +1,50 @@
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.test import TestCase
+
+import mock
+from nose.tools import eq_, ok_
+
+from airmozilla.base.utils import cached_count, paginate
+from airmozilla.main.models import Approval, Event, Participant
+
+
+class TestCachedCount(TestCase):
+    fixtures = ['airmozilla/manage/tests/main_testdata.json']
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached(self):
+        """Counts are reused until a table the queryset reads changes."""
+        events = Event.objects.approved()
+        eq_(cached_count(events), 1)
+        with self.assertNumQueries(0):
+            eq_(cached_count(events), 1)
+            eq_(paginate(events, 1, 10).paginator.count, 1)
+        Approval.objects.create(event=Event.objects.get(id=22))
+        eq_(cached_count(Event.objects.approved()), 0)
+
+    def test_signature(self):
+        """Different querysets do not share counts."""
+        eq_(cached_count(Event.objects.all()), 1)
+        eq_(cached_count(Event.objects.filter(public=False)), 0)
+        eq_(cached_count(Event.objects.filter(id__in=[])), 0)
+
+    def test_untracked_tables(self):
+        """Only registered tables pay for a generation bump, and counts
+           over other tables are not cached."""
+        with mock.patch('airmozilla.base.models.bump_generation') as bump:
+            Group.objects.create(name='untracked')
+            eq_(bump.call_count, 0)
+            Participant.objects.create(name='Tracked', slug='tracked')
+            ok_(bump.call_count)
+        count = Group.objects.count()
+        eq_(cached_count(Group.objects.all()), count)
+        with self.assertNumQueries(1):
+            eq_(cached_count(Group.objects.all()), count)
+
+    def test_count_provider(self):
+        paged = paginate(Event.objects.all(), 1, 10,
+                         count_provider=lambda objects: 42)
+        eq_(paged.paginator.num_pages, 5)
@@ -0,0 +1,40 @@
+"""sorl-thumbnail PIL engine decoding large images at reduced size.
+
+Placeholder images are often camera photos of several megapixels, while
+our thumbnails are 160px at most.  JPEG can be decoded directly at 1/2,
+1/4 or 1/8 of its size ("draft" mode), which is much faster and needs a
+fraction of the memory, so this engine decodes at the smallest of those
+scales that is still at least as large as the thumbnail.  Images that
+would still decode to more than THUMBNAIL_MAX_PIXELS are refused."""
+from django.conf import settings
+
+from sorl.thumbnail.engines import pil_engine
+
+
+def draft_size(size, geometry, crop):
+    """The smallest size an image of `size` can be decoded at for a
+       thumbnail of `geometry`.  Allows for the image being rotated by its
+       EXIF orientation afterwards."""
+    x_image, y_image = map(float, size)
+    factors = []
+    for x, y in (geometry, reversed(geometry)):
+        scale = (x / x_image, y / y_image)
+        factors.append(max(scale) if crop else min(scale))
+    factor = min(max(factors), 1)
+    return (max(int(x_image * factor + 0.5), 1),
+            max(int(y_image * factor + 0.5), 1))
+
+
+class Engine(pil_engine.Engine):
+
+    def create(self, image, geometry, options):
+        if image.format == 'JPEG':
+            crop = options['crop'] and options['crop'] != 'noop'
+            # Only changes how the image is read, so it must be called
+            # before anything loads it.
+            image.draft(image.mode, draft_size(image.size, geometry, crop))
+        width, height = image.size
+        if width * height > settings.THUMBNAIL_MAX_PIXELS:
+            raise IOError('Image too large to thumbnail: %dx%d'
+                          % (width, height))
+        return super(Engine, self).create(image, geometry, options)
@@ -1,9 +1,21 @@
+import datetime
 import functools
+import hashlib
 import json
 
 from django import http
+from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db import connections
+from django.db.models import Q, get_models
+from django.db.models.sql.datastructures import EmptyResultSet
 from django.template.defaultfilters import slugify
+from django.utils.encoding import smart_str
+from django.utils.timezone import utc
+
+from airmozilla.base.cache import get_generations
+from airmozilla.base.models import is_tracked, table_generation
 
 
 def unique_slugify(data, models, duplicate_key=''):
@@ -55,9 +67,70 @@ def _json_clean(value):
     return value.replace("</", "<\\/")
 
 
-def paginate(objects, page, count):
-    """Returns a set of paginated objects, count per page (on #page)"""
+def cached_count(objects):
+    """Count of a queryset, cached until a table it reads from changes.
+       Times in the query are taken to the minute, so that querysets
+       relative to now share a count for a minute.  Querysets reading a
+       table not registered with track_changes() are counted every time."""
+    query = objects.query
+    try:
+        sql, params = query.get_compiler(objects.db).as_sql()
+    except EmptyResultSet:
+        return 0
+    params = [p.replace(second=0, microsecond=0)
+              if isinstance(p, datetime.datetime) else p for p in params]
+    # Found in the SQL so that tables only read by subqueries count too.
+    quote_name = connections[objects.db].ops.quote_name
+    tables = sorted(set(
+        model._meta.db_table
+        for model in get_models(include_auto_created=True)
+        if quote_name(model._meta.db_table) in sql
+    ))
+    if not all(is_tracked(table) for table in tables):
+        return objects.count()
+    generations = get_generations([table_generation(table)
+                                   for table in tables])
+    key = 'count:%s' % hashlib.md5(
+        smart_str(repr((objects.db, sql, params, generations)))
+    ).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = objects.count()
+        cache.set(key, count, settings.PAGINATE_COUNT_TIMEOUT)
+    return count
+
+
+# Table statistics queries, by database vendor, for estimated_count.
+TABLE_ROWS_SQL = {
+    'mysql': ('SELECT table_rows FROM information_schema.tables '
+              'WHERE table_schema = DATABASE() AND table_name = %s'),
+    'postgresql': 'SELECT reltuples FROM pg_class WHERE relname = %s',
+}
+
+
+def estimated_count(objects):
+    """Row count of a whole table from the database statistics, when the
+       table has at least PAGINATE_ESTIMATE_MIN_ROWS rows.  Filtered
+       querysets, small tables and other databases get cached_count."""
+    query = objects.query
+    if not query.where and not query.having and not query.distinct:
+        connection = connections[objects.db]
+        sql = TABLE_ROWS_SQL.get(connection.vendor)
+        if sql:
+            cursor = connection.cursor()
+            cursor.execute(sql, [objects.model._meta.db_table])
+            row = cursor.fetchone()
+            if row and row[0] >= settings.PAGINATE_ESTIMATE_MIN_ROWS:
+                return int(row[0])
+    return cached_count(objects)
+
+
+def paginate(objects, page, count, count_provider=cached_count):
+    """Returns a set of paginated objects, count per page (on #page).
+       The total is taken from count_provider(objects) for querysets."""
     paginator = Paginator(objects, count)
+    if hasattr(objects, 'query'):
+        paginator._count = count_provider(objects)
     try:
         objects_paged = paginator.page(page)
     except PageNotAnInteger:
@@ -65,3 +138,94 @@ def paginate(objects, page, count):
     except EmptyPage:
         objects_paged = paginator.page(paginator.num_pages)
     return objects_paged
+
+
+def encode_cursor(key):
+    """Encodes a (datetime, id) keyset position for use in URLs."""
+    value, id = key
+    return '%s.%d' % (value.astimezone(utc).strftime('%Y%m%d%H%M%S%f'), id)
+
+
+def decode_cursor(cursor):
+    """Decodes a cursor from encode_cursor; None if it is not valid."""
+    try:
+        value, id = cursor.split('.')
+        value = datetime.datetime.strptime(value, '%Y%m%d%H%M%S%f')
+        return value.replace(tzinfo=utc), int(id)
+    except (AttributeError, ValueError):
+        return None
+
+
+class KeysetPage(object):
+    """A page of objects from keyset_paginate, with the parts of the
+       Django Page interface templates use."""
+
+    def __init__(self, object_list, field, has_older, has_newer):
+        self.object_list = object_list
+        self.field = field
+        self.has_older = has_older
+        self.has_newer = has_newer
+        self.number = None if has_newer else 1
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.has_older
+
+    def has_previous(self):
+        return self.has_newer
+
+    def _key(self, obj):
+        return getattr(obj, self.field), obj.id
+
+    def next_cursor(self):
+        """Cursor of the following (older) page."""
+        return encode_cursor(self._key(self.object_list[-1]))
+
+    def previous_cursor(self):
+        """Cursor of the preceding (newer) page."""
+        return encode_cursor(self._key(self.object_list[0]))
+
+
+def _older(field, key):
+    value, id = key
+    return (Q(**{'%s__lt' % field: value}) |
+            Q(**{field: value, 'id__lt': id}))
+
+
+def _newer(field, key):
+    value, id = key
+    return (Q(**{'%s__gt' % field: value}) |
+            Q(**{field: value, 'id__gt': id}))
+
+
+def keyset_paginate(objects, field, count, before=None, after=None):
+    """Returns a KeysetPage of objects, newest first by (field, id).  Pages
+       are found by seeking to the (field, id) keys `before` or `after`
+       rather than by offset, so deep pages cost the same as the first."""
+    if after is not None:
+        newer = list(objects.filter(_newer(field, after))
+                            .order_by(field, 'id')[:count + 1])
+        if len(newer) > count:
+            newer = newer[:count]
+            newer.reverse()
+            return KeysetPage(newer, field, True, True)
+        # Reached the newest objects; show a full first page.
+        before = None
+    if before is not None:
+        objects_paged = list(objects.filter(_older(field, before))
+                                    .order_by('-' + field, '-id')[:count + 1])
+        if objects_paged:
+            has_newer = objects.filter(
+                _newer(field, (getattr(objects_paged[0], field),
+                               objects_paged[0].id))
+            ).exists()
+            return KeysetPage(objects_paged[:count], field,
+                              len(objects_paged) > count, has_newer)
+    objects_paged = list(objects.order_by('-' + field, '-id')[:count + 1])
+    return KeysetPage(objects_paged[:count], field,
+                      len(objects_paged) > count, False)
@@ -1,16 +1,77 @@
+import datetime
+
 from django.conf import settings
 
-from airmozilla.main.models import Event
+from airmozilla.base.cache import get_tagged, set_tagged
+from airmozilla.main.models import Event, _get_now, events_tag, object_tag
+
+
+class LazyEvents(object):
+    """A list of events only loaded when a template first uses it."""
+
+    def __init__(self, load):
+        self._load = load
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __nonzero__(self):
+        return bool(self._load())
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+
+def _sidebar_snapshot(public):
+    """Featured and upcoming events, shared between requests until an
+       Event or Approval is saved or the next upcoming event goes live."""
+    cache_key = 'sidebar_public' if public else 'sidebar_all'
+    snapshot = get_tagged(cache_key)
+    if snapshot is None:
+        featured = Event.objects.approved().filter(featured=True)
+        upcoming = Event.objects.upcoming().order_by('start_time')
+        if public:
+            featured = featured.filter(public=True)
+            upcoming = upcoming.filter(public=True)
+        upcoming = upcoming[:settings.UPCOMING_SIDEBAR_COUNT]
+        snapshot = {
+            'featured': list(featured.prefetch_related('participants')),
+            'upcoming': list(upcoming.prefetch_related('participants')),
+        }
+        timeout = settings.SIDEBAR_CACHE_TIMEOUT
+        if snapshot['upcoming']:
+            live_time = (snapshot['upcoming'][0].start_time -
+                         datetime.timedelta(minutes=settings.LIVE_MARGIN))
+            until_live = live_time - _get_now()
+            timeout = min(timeout, until_live.days * 86400 +
+                          until_live.seconds + 1)
+        tags = [events_tag(True)]
+        if not public:
+            tags.append(events_tag(False))
+        for event in snapshot['featured'] + snapshot['upcoming']:
+            tags.append(object_tag(event, event.id))
+            tags.extend(object_tag(participant, participant.id)
+                        for participant in event.participants.all())
+        set_tagged(cache_key, snapshot, tags, max(timeout, 1))
+    return snapshot
 
 
 def sidebar(request):
-    featured = Event.objects.approved().filter(featured=True)
-    upcoming = Event.objects.upcoming().order_by('start_time')
-    if not request.user.is_active:
-        featured = featured.filter(public=True)
-        upcoming = upcoming.filter(public=True)
-    upcoming = upcoming[:settings.UPCOMING_SIDEBAR_COUNT]
+    snapshot = {}
+
+    def load(name):
+        def _load():
+            if not snapshot:
+                snapshot.update(
+                    _sidebar_snapshot(public=not request.user.is_active)
+                )
+            return snapshot[name]
+        return _load
+
     return {
-        'upcoming': upcoming,
-        'featured': featured
+        'upcoming': LazyEvents(load('upcoming')),
+        'featured': LazyEvents(load('featured'))
     }
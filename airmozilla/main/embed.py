@@ -0,0 +1,184 @@
+import datetime
+import hashlib
+import logging
+import Queue
+import threading
+from collections import OrderedDict
+
+from jinja2 import meta
+
+from django.conf import settings
+from django.db import connection
+from django.utils.encoding import smart_str
+
+from jingo import Template, env
+
+from airmozilla.base.cache import invalidate_tags, object_tag
+
+
+# Template variables which make a rendering depend on the current request
+# or time; templates using them cannot be rendered ahead of time.
+DYNAMIC_VARIABLES = ('request', 'datetime')
+
+log = logging.getLogger('airmozilla.embed')
+
+
+class CompiledTemplateCache(object):
+    """Process-wide LRU of compiled jingo templates, keyed by the Template
+       id and a hash of its content so that an edited template never
+       serves a stale compilation."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, template):
+        key = (template.id, hashlib.md5(smart_str(template.content))
+               .hexdigest())
+        with self._lock:
+            try:
+                entry = self._templates.pop(key)
+            except KeyError:
+                entry = None
+            else:
+                self._templates[key] = entry
+        if entry is None:
+            compiled = Template(template.content)
+            undeclared = meta.find_undeclared_variables(
+                env.parse(template.content)
+            )
+            dynamic = any(v in undeclared for v in DYNAMIC_VARIABLES)
+            entry = (compiled, dynamic)
+            with self._lock:
+                self._templates[key] = entry
+                while len(self._templates) > self.max_size:
+                    self._templates.popitem(last=False)
+        return entry
+
+    def get(self, template):
+        return self._entry(template)[0]
+
+    def is_dynamic(self, template):
+        return self._entry(template)[1]
+
+    def invalidate(self, template_id):
+        with self._lock:
+            for key in [k for k in self._templates if k[0] == template_id]:
+                del self._templates[key]
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+
+compiled_templates = CompiledTemplateCache(
+    settings.COMPILED_TEMPLATE_CACHE_SIZE
+)
+
+
+def get_compiled_template(template):
+    """Returns the compiled jingo Template for a main.Template instance."""
+    return compiled_templates.get(template)
+
+
+def render_event_template(event, request=None):
+    """Renders the video embed of an event.  Without a request, the
+       request-dependent variables are left out of the context."""
+    context = {
+        'md5': lambda s: hashlib.md5(s).hexdigest(),
+        'event': event,
+    }
+    if request is not None:
+        context['request'] = request
+        context['datetime'] = datetime.datetime.utcnow()
+    if isinstance(event.template_environment, dict):
+        context.update(event.template_environment)
+    return get_compiled_template(event.template).render(context)
+
+
+def prerender_event_template(event):
+    """Returns the embed to store with an event, or '' when it has to be
+       rendered on each request (no template, a template using `request`
+       or `datetime`, or a template that fails to render).  Never raises,
+       so that a broken template cannot prevent saving events."""
+    if not event.template:
+        return ''
+    try:
+        if compiled_templates.is_dynamic(event.template):
+            return ''
+        return render_event_template(event)
+    except Exception:
+        log.exception('Failed to render the embed of event %s', event.id)
+        return ''
+
+
+def rerender_events(events, template):
+    """Refreshes the stored embed of every event in the `events` queryset,
+       which all use `template`, in batches.  Updates are written directly
+       so that saving a template does not re-run the Event save hooks, and
+       the events updated are invalidated after each batch, as pages read
+       while the batches run may have cached the previous embed."""
+    batch_size = settings.EMBED_RERENDER_BATCH_SIZE
+    ids = list(events.values_list('id', flat=True))
+    for i in range(0, len(ids), batch_size):
+        batch = events.model.objects.filter(id__in=ids[i:i + batch_size])
+        updated = []
+        for event in batch:
+            event.template = template
+            rendered = prerender_event_template(event)
+            if rendered != event.template_rendered:
+                (events.model.objects.filter(id=event.id)
+                       .update(template_rendered=rendered))
+                updated.append(object_tag(events.model, event.id))
+        if updated:
+            invalidate_tags(*updated)
+    return len(ids)
+
+
+class RerenderPool(object):
+    """Daemon threads refreshing the embeds of the events of an edited
+       template, so that saving it does not wait for them.  With a size of
+       0 the events are re-rendered right away instead."""
+
+    def __init__(self, size):
+        self.size = size
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            while len(self._threads) < self.size:
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            template = self._queue.get()
+            try:
+                rerender_events(template.event_set.all(), template)
+            except Exception:
+                log.exception('Failed to re-render the events of template '
+                              '%s', template.id)
+            finally:
+                # Each thread has its own connection; do not keep it open
+                # while idle.
+                connection.close()
+                self._queue.task_done()
+
+    def submit(self, template):
+        if not self.size:
+            rerender_events(template.event_set.all(), template)
+            return
+        self._start()
+        self._queue.put(template)
+
+    def join(self):
+        """Waits until every submitted template has been handled."""
+        self._queue.join()
+
+
+rerender_pool = RerenderPool(settings.EMBED_RERENDER_WORKERS)
@@ -0,0 +1,20 @@
+from django import forms
+
+from airmozilla.base.forms import BaseForm
+
+
+class CalendarForm(BaseForm):
+    """Optional date range (inclusive) and filters for calendar feeds."""
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    category = forms.IntegerField(required=False)
+    location = forms.IntegerField(required=False)
+    tag = forms.IntegerField(required=False)
+
+    def clean(self):
+        cleaned_data = super(CalendarForm, self).clean()
+        start = cleaned_data.get('start')
+        end = cleaned_data.get('end')
+        if start and end and end < start:
+            raise forms.ValidationError('The end date is before the start.')
+        return cleaned_data
@@ -1,11 +1,10 @@
-import datetime
 import jinja2
 
 from django.utils.text import truncate_words
-from django.utils.timezone import utc
 
 from jingo import register
-from sorl.thumbnail import get_thumbnail
+
+from airmozilla.main.thumbnails import request_batch
 
 
 @register.filter
@@ -22,12 +21,6 @@ def js_date(dt, format='ddd, MMM D, YYYY, h:mma UTCZZ', enable_timeago=True):
                             format, formatted_datetime))
 
 
-@register.function
-def date_now():
-    """The current date in UTC."""
-    return datetime.datetime.utcnow().replace(tzinfo=utc, microsecond=0)
-
-
 @register.function
 def short_desc(event, words=25):
     """Takes an event object and returns a shortened description."""
@@ -35,8 +28,20 @@ def short_desc(event, words=25):
 
 
 @register.function
-def thumbnail(filename, geometry, **options):
-    try:
-        return get_thumbnail(filename, geometry, **options)
-    except IOError:
-        return None
+@jinja2.contextfunction
+def thumbnail(context, filename, geometry, **options):
+    """Thumbnail of an image, or None if it cannot be read.  Resolved
+       together with the ones queued by prefetch_thumbnails()."""
+    batch = request_batch(context.get('request'))
+    return batch.get(filename, geometry, **options)
+
+
+@register.function
+@jinja2.contextfunction
+def prefetch_thumbnails(context, objects, attribute, geometry, **options):
+    """Queues the thumbnails of `attribute` for every object, to be looked
+       up in one go by the first thumbnail() call.  Renders nothing."""
+    batch = request_batch(context.get('request'))
+    for obj in objects:
+        batch.add(getattr(obj, attribute), geometry, **options)
+    return ''
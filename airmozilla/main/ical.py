@@ -0,0 +1,124 @@
+"""Streaming iCalendar (RFC 5545) writer for the event feeds.
+
+Only emits what the feeds need, with the same line order, escaping and
+folding as vobject so that the output is byte-for-byte what
+vobject.iCalendar().serialize() produced for the same events."""
+import datetime
+import hashlib
+import urlparse
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.encoding import force_unicode, smart_str
+from django.utils.timezone import utc
+
+
+# Kept as vobject wrote it, so that existing feeds do not change.
+PRODID = '-//PYVOBJECT//NONSGML Version 1//EN'
+
+# Content lines are folded to 75 octets including the CRLF-space.
+LINE_LENGTH = 75
+
+
+def escape_text(value):
+    """Backslash-escapes a TEXT value."""
+    value = (force_unicode(value).replace('\\', '\\\\')
+             .replace(';', '\\;').replace(',', '\\,'))
+    return (value.replace('\r\n', '\\n').replace('\n', '\\n')
+            .replace('\r', '\\n'))
+
+
+def format_datetime(value):
+    """DATE-TIME value; aware datetimes are written in UTC."""
+    suffix = ''
+    if value.tzinfo is not None:
+        value = value.astimezone(utc)
+        suffix = 'Z'
+    return '%04d%02d%02dT%02d%02d%02d%s' % (
+        value.year, value.month, value.day,
+        value.hour, value.minute, value.second, suffix
+    )
+
+
+def fold_line(line):
+    """Folds a UTF-8 encoded content line, never splitting a multi-byte
+       character, and terminates it with CRLF."""
+    if len(line) < LINE_LENGTH:
+        return line + '\r\n'
+    chunks = []
+    start = 0
+    while start < len(line):
+        end = start + LINE_LENGTH - 1
+        if end >= len(line):
+            chunks.append(line[start:])
+            break
+        while (ord(line[end]) & 0xC0) == 0x80:
+            # Step back to the lead byte of a multi-byte character.
+            end -= 1
+        chunks.append(line[start:end])
+        start = end
+    return '\r\n '.join(chunks) + '\r\n'
+
+
+def content_line(name, value):
+    return fold_line(smart_str(u'%s:%s' % (name, value)))
+
+
+def iter_vevent(event, base_url):
+    """Yields the content lines of the VEVENT for an event."""
+    dtend = event.start_time + datetime.timedelta(hours=1)
+    uid = '%s@%s' % (event.id, urlparse.urlparse(base_url).netloc)
+    yield content_line('BEGIN', 'VEVENT')
+    yield content_line('UID', escape_text(uid))
+    yield content_line('DTSTART', format_datetime(event.start_time))
+    yield content_line('DTEND', format_datetime(dtend))
+    yield content_line('DESCRIPTION', escape_text(event.description))
+    if event.location:
+        yield content_line('LOCATION', escape_text(event.location.name))
+    yield content_line('SUMMARY', escape_text(event.title))
+    yield content_line('URL', escape_text(base_url + event.slug + '/'))
+    yield content_line('END', 'VEVENT')
+
+
+def serialize_vevent(event, base_url):
+    """Serialized VEVENT component for a single event."""
+    return ''.join(iter_vevent(event, base_url))
+
+
+def iter_calendar(name, fragments):
+    """Yields a VCALENDAR named `name` around serialized VEVENTs."""
+    yield content_line('BEGIN', 'VCALENDAR')
+    yield content_line('VERSION', '2.0')
+    yield content_line('PRODID', PRODID)
+    for fragment in fragments:
+        yield fragment
+    yield content_line('X-WR-CALNAME', escape_text(name))
+    yield content_line('END', 'VCALENDAR')
+
+
+def serialize_calendar(name, fragments):
+    return ''.join(iter_calendar(name, fragments))
+
+
+def _vevent_cache_key(event, base_url):
+    location = event.location.name if event.location else ''
+    variant = hashlib.md5(smart_str(base_url + location)).hexdigest()
+    return 'calendar_vevent:%s:%s:%s' % (
+        event.id, event.modified.strftime('%Y%m%d%H%M%S%f'), variant
+    )
+
+
+def vevent_fragments(events, base_url):
+    """Serialized VEVENTs for events, in order.  Each one is cached on the
+       event id and modification time, so only changed events are
+       serialized again."""
+    keys = [_vevent_cache_key(event, base_url) for event in events]
+    fragments = cache.get_many(keys)
+    missing = {}
+    for key, event in zip(keys, events):
+        if key not in fragments:
+            missing[key] = serialize_vevent(event, base_url)
+    if missing:
+        cache.set_many(missing, settings.CALENDAR_FRAGMENT_CACHE_TIMEOUT)
+        fragments.update(missing)
+    return [fragments[key] for key in keys]
@@ -8,10 +8,18 @@ from django.core.cache import cache
 from django.db import models
 from django.db.models import Q
 from django.dispatch import receiver
+from django.utils.encoding import smart_str
 from django.utils.timezone import utc
 
+from airmozilla.base.cache import (bump_generation, get_tagged,
+                                   invalidate_tags, object_tag, set_tagged)
+from airmozilla.base.models import table_generation, track_changes
 from airmozilla.base.utils import unique_slugify
+from airmozilla.main.embed import (compiled_templates,
+                                   prerender_event_template, rerender_pool)
 from airmozilla.main.fields import EnvironmentField
+from airmozilla.main.thumbnails import (image_fields, thumbnail_pool,
+                                        thumbnail_specs)
 from sorl.thumbnail import ImageField
 
 
@@ -128,17 +136,160 @@ def _get_live_time():
             datetime.timedelta(minutes=settings.LIVE_MARGIN))
 
 
+def _slug_cache_key(slug):
+    return 'event_slug:%s' % hashlib.md5(smart_str(slug)).hexdigest()
+
+
+def _clear_slug_cache(*slugs):
+    cache.delete_many([_slug_cache_key(slug) for slug in slugs])
+
+
+def _bundle_cache_key(event_id):
+    return 'event_bundle:%s' % event_id
+
+
+def events_tag(public):
+    """Cache tag of anything listing events of the given visibility."""
+    return 'events:public' if public else 'events:private'
+
+
+# Cache tag of what only depends on the archived events, invalidated when
+# an event that is or was archived changes.  Events getting archived as
+# time passes are handled by the transitions.
+ARCHIVE_TAG = 'events:archived'
+
+
+def _month_start(time):
+    time = time.astimezone(utc)
+    return datetime.datetime(time.year, time.month, 1, tzinfo=utc)
+
+
+def _next_month(month):
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def _month_cache_key(public, month):
+    return 'calendar_month:%s:%s' % ('public' if public else 'private',
+                                     month.strftime('%Y%m'))
+
+
+def _clear_month_cache(*times):
+    months = set(_month_start(time) for time in times if time)
+    cache.delete_many([_month_cache_key(public, month) for month in months
+                       for public in (True, False)])
+
+
+def _calendar_changed_key(public):
+    return 'calendar_changed:%s' % ('public' if public else 'private')
+
+
+def calendar_changed(public):
+    """When the feed of the given visibility last changed in a way its
+       events do not show, e.g. one of them was deleted.  Never goes back:
+       when the key is lost, it starts again from now."""
+    key = _calendar_changed_key(public)
+    changed = cache.get(key)
+    if changed is None:
+        changed = _get_now()
+        cache.add(key, changed, settings.CALENDAR_CHANGED_TIMEOUT)
+    return changed
+
+
+def touch_calendars(*publics):
+    now = _get_now()
+    cache.set_many(dict((_calendar_changed_key(public), now)
+                        for public in publics),
+                   settings.CALENDAR_CHANGED_TIMEOUT)
+
+
 class EventManager(models.Manager):
+    def resolve_slug(self, slug):
+        """Returns (event id, current slug) for a current or old event slug,
+           None if no event has it.  Misses are cached too, briefly."""
+        key = _slug_cache_key(slug)
+        resolved = cache.get(key)
+        if resolved is None:
+            found = (
+                list(self.get_query_set().filter(slug=slug)
+                         .values_list('id', 'slug')[:1]) or
+                list(EventOldSlug.objects.filter(slug=slug)
+                                 .values_list('event_id', 'event__slug')[:1])
+            )
+            if found:
+                resolved = tuple(found[0])
+                cache.set(key, resolved, settings.SLUG_CACHE_TIMEOUT)
+            else:
+                resolved = ()
+                cache.set(key, resolved, settings.SLUG_CACHE_MISS_TIMEOUT)
+        return resolved or None
+
+    def page_bundle(self, event_id):
+        """Returns a dict with the event and everything its page shows,
+           fetched in a fixed number of queries and cached as one object
+           until the event or anything it shows changes."""
+        key = _bundle_cache_key(event_id)
+        bundle = get_tagged(key)
+        if bundle is None:
+            event = (self.get_query_set()
+                         .select_related('template', 'location', 'category')
+                         .prefetch_related('participants', 'tags')
+                         .get(id=event_id))
+            bundle = {
+                'event': event,
+                'participants': [p for p in event.participants.all()
+                                 if p.is_clear()],
+                'tags': list(event.tags.all()),
+                'pending_approval': (event.approval_state !=
+                                     Event.APPROVAL_STATE_APPROVED),
+            }
+            tags = [object_tag(Event, event.id)]
+            for related in (event.template, event.location, event.category):
+                if related is not None:
+                    tags.append(object_tag(related, related.id))
+            tags.extend(object_tag(obj, obj.id) for obj in
+                        list(event.participants.all()) + bundle['tags'])
+            set_tagged(key, bundle, tags, settings.EVENT_BUNDLE_CACHE_TIMEOUT)
+        return bundle
+
+    def calendar_range(self, public, start, end):
+        """Approved events with the given visibility starting from `start`
+           until before `end`, ordered by start time.  Assembled from one
+           cached block of events per calendar month."""
+        months = []
+        month = _month_start(start)
+        while month < end:
+            months.append(month)
+            month = _next_month(month)
+        keys = [_month_cache_key(public, m) for m in months]
+        blocks = cache.get_many(keys)
+        missing = {}
+        for key, month in zip(keys, months):
+            if key not in blocks:
+                missing[key] = list(
+                    self.approved()
+                        .filter(public=public, start_time__gte=month,
+                                start_time__lt=_next_month(month))
+                        .select_related('location')
+                        .prefetch_related('tags')
+                        .order_by('start_time')
+                )
+        if missing:
+            cache.set_many(missing, settings.CALENDAR_MONTH_CACHE_TIMEOUT)
+            blocks.update(missing)
+        return [event for key in keys for event in blocks[key]
+                if start <= event.start_time < end]
+
     def initiated(self):
-        return (self.get_query_set().filter(Q(status=Event.STATUS_INITIATED) |
-                                            Q(approval__approved=False) |
-                                            Q(approval__processed=False))
-                    .distinct())
+        return self.get_query_set().filter(
+            Q(status=Event.STATUS_INITIATED) |
+            ~Q(approval_state=Event.APPROVAL_STATE_APPROVED)
+        )
 
     def approved(self):
-        return (self.get_query_set().exclude(approval__approved=False)
-                    .exclude(approval__processed=False)
-                    .filter(status=Event.STATUS_SCHEDULED))
+        return self.get_query_set().filter(
+            approval_state=Event.APPROVAL_STATE_APPROVED,
+            status=Event.STATUS_SCHEDULED
+        )
 
     def upcoming(self):
         return self.approved().filter(
@@ -166,12 +317,72 @@ class EventManager(models.Manager):
 
     def archived_and_removed(self):
         return self.get_query_set().filter(
-            (Q(archive_time__lt=_get_now(), start_time__lt=_get_now())
-             & ~Q(approval__approved=False)
-             & ~Q(approval__processed=False))
+            Q(archive_time__lt=_get_now(), start_time__lt=_get_now(),
+              approval_state=Event.APPROVAL_STATE_APPROVED)
             | Q(status=Event.STATUS_REMOVED)
         )
 
+    def by_lifecycle_state(self, **filters):
+        """Events matching `filters` which are not archived or removed,
+           fetched in one query and bucketed by Event.lifecycle_state().
+           Returns {state: [events]}, ordered by start time, except the
+           archiving events which are the most recently archived first."""
+        now = _get_now()
+        events = (
+            self.get_query_set().filter(**filters)
+                .exclude(status=Event.STATUS_REMOVED)
+                .filter(Q(archive_time=None) | Q(archive_time__gt=now) |
+                        Q(status=Event.STATUS_INITIATED) |
+                        ~Q(approval_state=Event.APPROVAL_STATE_APPROVED))
+                .select_related('category', 'location')
+                .order_by('start_time')
+        )
+        states = dict((state, []) for state in Event.LIFECYCLE_STATES)
+        for event in events:
+            states[event.lifecycle_state(now)].append(event)
+        states[Event.LIFECYCLE_ARCHIVING].sort(
+            key=lambda event: event.archive_time, reverse=True
+        )
+        return states
+
+    def update_approval_state(self, events):
+        """Recomputes the approval_state of the events in the `events`
+           queryset from their approvals, writing only changed rows, and
+           invalidates what shows the events changed."""
+        approvals = Approval.objects.filter(
+            Q(approved=False) | Q(processed=False),
+            event__in=events
+        )
+        rejected = set(approvals.filter(processed=True)
+                                .values_list('event', flat=True))
+        pending = set(approvals.values_list('event', flat=True)) - rejected
+        changed = []
+        for state, ids in ((Event.APPROVAL_STATE_REJECTED, rejected),
+                           (Event.APPROVAL_STATE_PENDING, pending)):
+            if ids:
+                changed += self._set_approval_state(events.filter(id__in=ids),
+                                                    state)
+        if rejected or pending:
+            events = events.exclude(id__in=rejected | pending)
+        changed += self._set_approval_state(events,
+                                            Event.APPROVAL_STATE_APPROVED)
+        if changed:
+            # update() sends no signals; counts over events are stale.
+            bump_generation(table_generation(Event._meta.db_table))
+            _invalidate_updated_events(changed)
+        return len(changed)
+
+    def _set_approval_state(self, events, state):
+        """Sets the approval_state of the `events` not in `state` yet and
+           returns their (id, public, start_time, archive_time)."""
+        rows = list(events.exclude(approval_state=state)
+                          .values_list('id', 'public', 'start_time',
+                                       'archive_time'))
+        if rows:
+            (self.get_query_set().filter(id__in=[row[0] for row in rows])
+                 .update(approval_state=state))
+        return rows
+
 
 class Event(models.Model):
     """ Events - all the essential data and metadata for publishing. """
@@ -185,6 +396,7 @@ class Event(models.Model):
         help_text='Specify the template variables in the format'
         '<code>variable1=value</code>, one per line.'
     )
+    template_rendered = models.TextField(blank=True, editable=False)
     STATUS_INITIATED = 'initiated'
     STATUS_SCHEDULED = 'scheduled'
     STATUS_REMOVED = 'removed'
@@ -195,6 +407,29 @@ class Event(models.Model):
     )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES,
                               default=STATUS_INITIATED, db_index=True)
+    # Kept up to date from the event's approvals by approval_update_state.
+    APPROVAL_STATE_PENDING = 'pending'
+    APPROVAL_STATE_APPROVED = 'approved'
+    APPROVAL_STATE_REJECTED = 'rejected'
+    APPROVAL_STATE_CHOICES = (
+        (APPROVAL_STATE_PENDING, 'Pending'),
+        (APPROVAL_STATE_APPROVED, 'Approved'),
+        (APPROVAL_STATE_REJECTED, 'Rejected')
+    )
+    approval_state = models.CharField(max_length=20,
+                                      choices=APPROVAL_STATE_CHOICES,
+                                      default=APPROVAL_STATE_APPROVED,
+                                      db_index=True, editable=False)
+    # Where an event is in its life, from its status, approvals and times.
+    LIFECYCLE_INITIATED = 'initiated'
+    LIFECYCLE_UPCOMING = 'upcoming'
+    LIFECYCLE_LIVE = 'live'
+    LIFECYCLE_ARCHIVING = 'archiving'
+    LIFECYCLE_ARCHIVED = 'archived'
+    LIFECYCLE_REMOVED = 'removed'
+    LIFECYCLE_STATES = (LIFECYCLE_INITIATED, LIFECYCLE_UPCOMING,
+                        LIFECYCLE_LIVE, LIFECYCLE_ARCHIVING,
+                        LIFECYCLE_ARCHIVED, LIFECYCLE_REMOVED)
     placeholder_img = ImageField(upload_to=_upload_path('event-placeholder'))
     description = models.TextField()
     short_description = models.TextField(
@@ -240,6 +475,26 @@ class Event(models.Model):
         return (self.archive_time is None and
                 self.start_time > _get_live_time())
 
+    def lifecycle_state(self, now=None):
+        """Which of the LIFECYCLE_STATES the event is in at `now`."""
+        if now is None:
+            now = _get_now()
+        live_time = now + datetime.timedelta(minutes=settings.LIVE_MARGIN)
+        if self.status == Event.STATUS_REMOVED:
+            return Event.LIFECYCLE_REMOVED
+        if (self.status == Event.STATUS_INITIATED or
+                self.approval_state != Event.APPROVAL_STATE_APPROVED):
+            return Event.LIFECYCLE_INITIATED
+        if self.start_time >= live_time:
+            return Event.LIFECYCLE_UPCOMING
+        if self.archive_time is None:
+            return Event.LIFECYCLE_LIVE
+        if self.archive_time > now:
+            return Event.LIFECYCLE_ARCHIVING
+        if self.start_time < now:
+            return Event.LIFECYCLE_ARCHIVED
+        return Event.LIFECYCLE_UPCOMING
+
     def is_removed(self):
         return self.status == self.STATUS_REMOVED
 
@@ -264,11 +519,185 @@ class Approval(models.Model):
     comment = models.TextField(blank=True)
 
 
+# The tables the paginated listings count.
+track_changes(Event, Participant, Category, Location, User)
+
+
+@receiver(models.signals.pre_save, sender=Approval)
+def approval_remember_event(sender, instance, **kwargs):
+    instance._old_event_id = None
+    if instance.id:
+        instance._old_event_id = (
+            Approval.objects.filter(id=instance.id)
+                            .values_list('event', flat=True) or [None]
+        )[0]
+
+
+@receiver(models.signals.post_save, sender=Approval)
+@receiver(models.signals.post_delete, sender=Approval)
+def approval_update_state(sender, instance, **kwargs):
+    # Connected before the cache receivers below, which then see the
+    # new state.
+    event_ids = set([instance.event_id,
+                     getattr(instance, '_old_event_id', None)])
+    event_ids.discard(None)
+    Event.objects.update_approval_state(
+        Event.objects.filter(id__in=event_ids)
+    )
+
+
+def _invalidate_events(event_id, *publics):
+    invalidate_tags(object_tag(Event, event_id),
+                    *[events_tag(public) for public in publics])
+    # Feeds can change without any event in them being modified.
+    touch_calendars(*publics)
+
+
+def _invalidate_updated_events(rows):
+    """What the Event receivers invalidate, for events changed with
+       update(), from their (id, public, start_time, archive_time)."""
+    now = _get_now()
+    publics = set(public for __, public, __, __ in rows)
+    tags = [object_tag(Event, id) for id, __, __, __ in rows]
+    tags.extend(events_tag(public) for public in publics)
+    if any(archive_time is not None and archive_time < now
+           for __, __, __, archive_time in rows):
+        tags.append(ARCHIVE_TAG)
+    invalidate_tags(*tags)
+    touch_calendars(*publics)
+    _clear_month_cache(*[start_time for __, __, start_time, __ in rows])
+
+
+@receiver(models.signals.post_save, sender=Event)
+@receiver(models.signals.post_delete, sender=Event)
+def event_invalidate(sender, instance, **kwargs):
+    _invalidate_events(instance.id, instance.public,
+                       getattr(instance, '_old_public', instance.public))
+
+
 @receiver(models.signals.post_save, sender=Event)
+@receiver(models.signals.post_delete, sender=Event)
+def event_invalidate_archive(sender, instance, **kwargs):
+    if (getattr(instance, '_old_archived', False) or
+            instance.lifecycle_state() == Event.LIFECYCLE_ARCHIVED):
+        invalidate_tags(ARCHIVE_TAG)
+
+
 @receiver(models.signals.post_save, sender=Approval)
-def event_clear_cache(sender, **kwargs):
-    cache.delete('calendar_public')
-    cache.delete('calendar_private')
+@receiver(models.signals.post_delete, sender=Approval)
+def approval_invalidate(sender, instance, **kwargs):
+    stored = (Event.objects.filter(id=instance.event_id)
+                           .values_list('public', 'archive_time'))
+    for public, archive_time in stored:
+        _invalidate_events(instance.event_id, public)
+        if archive_time is not None and archive_time < _get_now():
+            # The approval may move the event in or out of the archive.
+            invalidate_tags(ARCHIVE_TAG)
+
+
+@receiver(models.signals.pre_save, sender=Event)
+def event_remember_stored(sender, instance, raw, *args, **kwargs):
+    if raw or not instance.id:
+        return
+    stored = Event.objects.filter(id=instance.id).values_list(
+        'start_time', 'public', 'approval_state', 'placeholder_img',
+        'status', 'archive_time'
+    )
+    for (start_time, public, approval_state, placeholder_img,
+         status, archive_time) in stored:
+        instance._old_start_time = start_time
+        instance._old_public = public
+        instance._old_placeholder_img = placeholder_img
+        instance._old_archived = Event(
+            status=status, approval_state=approval_state,
+            start_time=start_time, archive_time=archive_time
+        ).lifecycle_state() == Event.LIFECYCLE_ARCHIVED
+        # Maintained from the approvals; never overwritten by a save.
+        instance.approval_state = approval_state
+
+
+@receiver(models.signals.post_save, sender=Event)
+@receiver(models.signals.post_delete, sender=Event)
+def event_clear_months(sender, instance, **kwargs):
+    _clear_month_cache(instance.start_time,
+                       getattr(instance, '_old_start_time', None))
+
+
+@receiver(models.signals.post_save, sender=Approval)
+@receiver(models.signals.post_delete, sender=Approval)
+def approval_clear_months(sender, instance, **kwargs):
+    _clear_month_cache(*Event.objects.filter(id=instance.event_id)
+                                     .values_list('start_time', flat=True))
+
+
+@receiver(models.signals.m2m_changed, sender=Event.tags.through)
+def event_tags_clear_months(sender, instance, action, reverse, pk_set,
+                            **kwargs):
+    if reverse and action == 'pre_clear':
+        events = instance.event_set.all()
+    elif reverse and action in ('post_add', 'post_remove'):
+        events = Event.objects.filter(id__in=pk_set)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        _clear_month_cache(instance.start_time)
+        return
+    else:
+        return
+    _clear_month_cache(*events.values_list('start_time', flat=True))
+
+
+@receiver(models.signals.post_save, sender=Location)
+@receiver(models.signals.pre_delete, sender=Location)
+@receiver(models.signals.pre_delete, sender=Tag)
+def related_clear_months(sender, instance, **kwargs):
+    # Month blocks hold their events with the location and tags; deleting
+    # takes them off the events without saving the events.
+    _clear_month_cache(*instance.event_set.values_list('start_time',
+                                                       flat=True))
+    if sender is Location:
+        # Feeds show the location name.
+        touch_calendars(True, False)
+
+
+@receiver(models.signals.m2m_changed, sender=Event.participants.through)
+@receiver(models.signals.m2m_changed, sender=Event.tags.through)
+def event_m2m_invalidate(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    if reverse and action == 'pre_clear':
+        # Clearing from the related side does not say which events.
+        event_ids = instance.event_set.values_list('id', flat=True)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        event_ids = (pk_set or []) if reverse else [instance.id]
+    else:
+        return
+    invalidate_tags(*[object_tag(Event, event_id) for event_id in event_ids])
+
+
+@receiver(models.signals.post_save, sender=Participant)
+@receiver(models.signals.post_delete, sender=Participant)
+@receiver(models.signals.post_save, sender=Tag)
+@receiver(models.signals.post_delete, sender=Tag)
+@receiver(models.signals.post_save, sender=Category)
+@receiver(models.signals.post_delete, sender=Category)
+@receiver(models.signals.post_save, sender=Location)
+@receiver(models.signals.post_delete, sender=Location)
+@receiver(models.signals.post_save, sender=Template)
+@receiver(models.signals.post_delete, sender=Template)
+def related_invalidate(sender, instance, **kwargs):
+    invalidate_tags(object_tag(sender, instance.id))
+
+
+@receiver(models.signals.post_save, sender=Template)
+@receiver(models.signals.post_delete, sender=Template)
+def template_clear_compiled(sender, instance, **kwargs):
+    compiled_templates.invalidate(instance.id)
+
+
+@receiver(models.signals.post_save, sender=Template)
+def template_rerender_events(sender, instance, raw, **kwargs):
+    # "Changes affect all events associated with this template."
+    if raw:
+        return
+    rerender_pool.submit(instance)
 
 
 @receiver(models.signals.pre_save, sender=Event)
@@ -281,11 +710,22 @@ def event_update_slug(sender, instance, raw, *args, **kwargs):
     try:
         old = Event.objects.get(id=instance.id)
         if instance.slug != old.slug:
+            # Older slugs redirect straight to the new one from now on.
+            _clear_slug_cache(*old.eventoldslug_set
+                                 .values_list('slug', flat=True))
             EventOldSlug.objects.create(slug=old.slug, event=instance)
     except Event.DoesNotExist:
         pass
 
 
+@receiver(models.signals.post_save, sender=Event)
+@receiver(models.signals.post_delete, sender=Event)
+@receiver(models.signals.post_save, sender=EventOldSlug)
+@receiver(models.signals.post_delete, sender=EventOldSlug)
+def event_clear_slug_cache(sender, instance, **kwargs):
+    _clear_slug_cache(instance.slug)
+
+
 @receiver(models.signals.pre_save, sender=Event)
 def event_consistent_times(sender, instance, raw, *arg, **kwargs):
     # Fix an edge case with disappearing events.
@@ -297,7 +737,40 @@ def event_consistent_times(sender, instance, raw, *arg, **kwargs):
         instance.archive_time = None
 
 
+@receiver(models.signals.pre_save, sender=Event)
+def event_render_template(sender, instance, raw, *args, **kwargs):
+    if raw:
+        return
+    instance.template_rendered = prerender_event_template(instance)
+
+
 @receiver(models.signals.pre_save, sender=Participant)
 def participant_update_slug(sender, instance, raw, *args, **kwargs):
     if not raw and not instance.slug:
         instance.slug = unique_slugify(instance.name, [Participant])
+
+
+@receiver(models.signals.pre_save, sender=Participant)
+def participant_remember_photo(sender, instance, raw, *args, **kwargs):
+    if raw or not instance.id:
+        return
+    stored = Participant.objects.filter(id=instance.id).values_list(
+        'photo', flat=True
+    )
+    for photo in stored:
+        instance._old_photo = photo
+
+
+@receiver(models.signals.post_save, sender=Event)
+@receiver(models.signals.post_save, sender=Participant)
+def pregenerate_thumbnails(sender, instance, raw, **kwargs):
+    """Generates the thumbnails of new images before anyone asks."""
+    if raw:
+        return
+    specs = []
+    for field, geometries in image_fields(sender).iteritems():
+        image = getattr(instance, field)
+        if image and image.name != getattr(instance, '_old_' + field, None):
+            specs.extend(thumbnail_specs(image, geometries))
+    if specs:
+        thumbnail_pool.submit(specs)
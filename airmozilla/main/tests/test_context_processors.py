@@ -0,0 +1,58 @@
+import datetime
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.utils.timezone import utc
+
+from nose.tools import eq_, ok_
+
+from airmozilla.main.context_processors import sidebar
+from airmozilla.main.models import Event
+
+
+class SidebarTests(TestCase):
+    fixtures = ['airmozilla/manage/tests/main_testdata.json']
+
+    def setUp(self):
+        cache.clear()
+        event = Event.objects.get(id=22)
+        event.start_time = (datetime.datetime.utcnow().replace(tzinfo=utc)
+                            + datetime.timedelta(days=1))
+        event.archive_time = None
+        event.featured = True
+        event.save()
+        self.request = RequestFactory().get('/')
+        self.request.user = AnonymousUser()
+
+    def test_lazy(self):
+        """No queries are made until a template reads the sidebar."""
+        with self.assertNumQueries(0):
+            context = sidebar(self.request)
+        eq_([e.id for e in context['upcoming']], [22])
+        eq_([e.id for e in context['featured']], [22])
+
+    def test_cached(self):
+        """The sidebar is shared between requests until events change."""
+        list(sidebar(self.request)['upcoming'])
+        with self.assertNumQueries(0):
+            context = sidebar(self.request)
+            ok_(context['upcoming'])
+            ok_(context['featured'])
+            for event in context['upcoming']:
+                list(event.participants.all())
+        event = Event.objects.get(id=22)
+        event.featured = False
+        event.save()
+        ok_(not sidebar(self.request)['featured'])
+
+    def test_participant_change(self):
+        """Renaming a participant of a listed event refreshes the sidebar."""
+        list(sidebar(self.request)['upcoming'])
+        participant = Event.objects.get(id=22).participants.get()
+        participant.name = 'Someone Else'
+        participant.save()
+        upcoming = list(sidebar(self.request)['upcoming'])
+        eq_([p.name for p in upcoming[0].participants.all()],
+            ['Someone Else'])
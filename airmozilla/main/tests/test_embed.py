@@ -0,0 +1,124 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+import mock
+from nose.tools import eq_, ok_
+
+from airmozilla.main.embed import (compiled_templates, get_compiled_template,
+                                   prerender_event_template, rerender_pool)
+from airmozilla.main.models import Event, Template
+
+
+class CompiledTemplateCacheTests(TestCase):
+    fixtures = ['airmozilla/manage/tests/main_testdata.json']
+
+    def setUp(self):
+        compiled_templates.clear()
+
+    def test_compiled_once(self):
+        """A template is compiled once and reused until its content
+           changes."""
+        template = Template.objects.get(id=1)
+        compiled = get_compiled_template(template)
+        ok_(get_compiled_template(template) is compiled)
+        eq_(compiled.render({'tv1': 'a', 'tv2': 'b'}), 'worldab')
+        template.content = '{{ tv1 }}'
+        template.save()
+        recompiled = get_compiled_template(template)
+        ok_(recompiled is not compiled)
+        eq_(recompiled.render({'tv1': 'a'}), 'a')
+
+    def test_invalidated_on_save(self):
+        """Saving a Template evicts its compiled entries."""
+        template = Template.objects.get(id=1)
+        get_compiled_template(template)
+        template.save()
+        ok_(not [k for k in compiled_templates._templates
+                 if k[0] == template.id])
+
+    def test_lru_eviction(self):
+        """The least recently used template is evicted past max_size."""
+        max_size = compiled_templates.max_size
+        compiled_templates.max_size = 2
+        try:
+            templates = [Template.objects.create(name=str(i),
+                                                 content='{{ %d }}' % i)
+                         for i in range(3)]
+            for template in templates:
+                get_compiled_template(template)
+            ids = [k[0] for k in compiled_templates._templates]
+            eq_(ids, [templates[1].id, templates[2].id])
+        finally:
+            compiled_templates.max_size = max_size
+
+
+class PrerenderedTemplateTests(TestCase):
+    fixtures = ['airmozilla/manage/tests/main_testdata.json']
+
+    def test_rendered_on_save(self):
+        """The embed is stored with the event when it is saved."""
+        event = Event.objects.get(id=22)
+        event.template_environment = {'tv1': 'a', 'tv2': 'b'}
+        event.save()
+        eq_(Event.objects.get(id=22).template_rendered, 'worldab')
+
+    def test_dynamic_not_stored(self):
+        """Templates using the request or time are rendered per request."""
+        template = Template.objects.get(id=1)
+        template.content = '{{ request.path }}'
+        template.save()
+        event = Event.objects.get(id=22)
+        event.save()
+        eq_(Event.objects.get(id=22).template_rendered, '')
+
+    def test_render_error_not_raised(self):
+        """A template failing with any error still lets events save."""
+        template = Template.objects.get(id=1)
+        template.content = '{{ md5(event.title) }}'
+        template.save()
+        event = Event.objects.get(id=22)
+        event.title = u'Caf\xe9'
+        event.save()
+        eq_(Event.objects.get(id=22).template_rendered, '')
+
+    def test_template_change_rerenders(self):
+        """Editing a template refreshes every event using it."""
+        event = Event.objects.get(id=22)
+        event.save()
+        template = Template.objects.get(id=1)
+        template.content = 'changed {{ event.title }}'
+        template.save()
+        eq_(Event.objects.get(id=22).template_rendered, 'changed Test event')
+
+    def test_template_change_queued(self):
+        """Saving a template hands the events to the re-render pool."""
+        template = Template.objects.get(id=1)
+        with mock.patch.object(rerender_pool, 'submit') as submit:
+            template.content = 'changed {{ event.title }}'
+            template.save()
+        eq_(submit.call_count, 1)
+        eq_(submit.call_args[0][0].id, template.id)
+        ok_(Event.objects.get(id=22).template_rendered != 'changed Test event')
+
+    def test_template_change_invalidates_bundle(self):
+        """The cached page bundle shows the re-rendered embed, even when
+           the page was read while the events were being re-rendered."""
+        cache.clear()
+        event = Event.objects.get(id=22)
+        event.save()
+        eq_(Event.objects.page_bundle(22)['event'].template_rendered,
+            'world')
+
+        def prerender(event):
+            # A page view while the batch runs, after the template tag
+            # was already invalidated.
+            Event.objects.page_bundle(event.id)
+            return prerender_event_template(event)
+
+        template = Template.objects.get(id=1)
+        template.content = 'changed {{ event.title }}'
+        with mock.patch('airmozilla.main.embed.prerender_event_template',
+                        side_effect=prerender):
+            template.save()
+        eq_(Event.objects.page_bundle(22)['event'].template_rendered,
+            'changed Test event')
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import datetime
+import vobject
+
+from django.test import TestCase
+from django.utils.timezone import utc
+
+from nose.tools import eq_
+
+from airmozilla.main import ical
+from airmozilla.main.models import Event, Location
+
+
+def vobject_calendar(name, events, base_url):
+    """The feed as it used to be built with vobject."""
+    cal = vobject.iCalendar()
+    cal.add('X-WR-CALNAME').value = name
+    for event in events:
+        vevent = cal.add('vevent')
+        vevent.add('uid').value = '%s@example.com' % event.id
+        vevent.add('summary').value = event.title
+        vevent.add('dtstart').value = event.start_time
+        vevent.add('dtend').value = (event.start_time +
+                                     datetime.timedelta(hours=1))
+        vevent.add('description').value = event.description
+        if event.location:
+            vevent.add('location').value = event.location.name
+        vevent.add('url').value = base_url + event.slug + '/'
+    return cal.serialize()
+
+
+class SerializerTests(TestCase):
+    base_url = 'https://example.com/'
+
+    def _events(self):
+        start = datetime.datetime(2012, 6, 21, 19, 30, tzinfo=utc)
+        texts = [
+            u'Short',
+            u'Commas, semicolons; back\\slashes and\nnewlines\r\n',
+            u'Long ' * 40,
+            u'Ünïcødé straddling the fold ' + u'日本語' * 30,
+            u'',
+        ]
+        events = []
+        for i, text in enumerate(texts):
+            event = Event(id=i + 1, title=text, description=text * 3,
+                          slug='event-%d' % i,
+                          start_time=start + datetime.timedelta(days=i))
+            if i % 2:
+                event.location = Location(name=text)
+            events.append(event)
+        return events
+
+    def test_byte_identical(self):
+        """The native writer produces exactly what vobject did."""
+        events = self._events()
+        fragments = [ical.serialize_vevent(event, self.base_url)
+                     for event in events]
+        for name in (u'Air Mozilla Public Events', u'Ünïcødé, names; ' * 8):
+            eq_(ical.serialize_calendar(name, fragments),
+                vobject_calendar(name, events, self.base_url))
+
+    def test_fold_line(self):
+        """Lines are folded at 75 octets without splitting characters."""
+        eq_(ical.fold_line('A' * 74), 'A' * 74 + '\r\n')
+        eq_(ical.fold_line('A' * 75), 'A' * 74 + '\r\n A\r\n')
+        folded = ical.fold_line('A' * 73 + u'é'.encode('utf-8'))
+        eq_(folded, 'A' * 73 + '\r\n ' + u'é'.encode('utf-8') + '\r\n')
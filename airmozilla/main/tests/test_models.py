@@ -1,12 +1,15 @@
 import datetime
 
 from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 from django.utils.timezone import utc
 
 from nose.tools import ok_, eq_
 
-from airmozilla.main.models import Approval, Event, EventOldSlug
+from airmozilla.main.models import (Approval, Event, EventOldSlug,
+                                    Participant, Tag)
 
 
 class EventStateTests(TestCase):
@@ -35,6 +38,14 @@ class EventStateTests(TestCase):
         app.approved = True
         app.save()
         ok_(to_approve in Event.objects.approved())
+        # a saved event keeps the state of its approvals
+        rejected = Approval.objects.create(event=to_approve, processed=True)
+        eq_(Event.objects.get(id=to_approve.id).approval_state,
+            Event.APPROVAL_STATE_REJECTED)
+        to_approve.save()
+        ok_(to_approve in Event.objects.initiated())
+        rejected.delete()
+        ok_(to_approve in Event.objects.approved())
         to_approve.status = Event.STATUS_REMOVED
         to_approve.save()
         ok_(to_approve in Event.objects.archived_and_removed())
@@ -88,6 +99,42 @@ class EventStateTests(TestCase):
         archived.save()
         ok_(archived in Event.objects.archived_and_removed())
         ok_(archived not in Event.objects.archived())
+
+    def test_lifecycle_state(self):
+        """Events are bucketed by the same rules as the managers."""
+        now = datetime.datetime.utcnow().replace(tzinfo=utc)
+        hour = datetime.timedelta(hours=1)
+        events = {}
+        for state, status, start_time, archive_time in (
+            (Event.LIFECYCLE_INITIATED, Event.STATUS_INITIATED, now, None),
+            (Event.LIFECYCLE_UPCOMING, Event.STATUS_SCHEDULED,
+             now + hour, None),
+            (Event.LIFECYCLE_LIVE, Event.STATUS_SCHEDULED, now, None),
+            (Event.LIFECYCLE_ARCHIVING, Event.STATUS_SCHEDULED,
+             now - hour, now + hour),
+            (Event.LIFECYCLE_ARCHIVED, Event.STATUS_SCHEDULED,
+             now - hour, now - hour),
+            (Event.LIFECYCLE_REMOVED, Event.STATUS_REMOVED, now, None),
+        ):
+            events[state] = Event.objects.create(status=status,
+                                                 start_time=start_time,
+                                                 archive_time=archive_time)
+            eq_(events[state].lifecycle_state(), state)
+        managers = {
+            Event.LIFECYCLE_INITIATED: Event.objects.initiated(),
+            Event.LIFECYCLE_UPCOMING: Event.objects.upcoming(),
+            Event.LIFECYCLE_LIVE: Event.objects.live(),
+            Event.LIFECYCLE_ARCHIVING: Event.objects.archiving(),
+        }
+        with self.assertNumQueries(1):
+            states = Event.objects.by_lifecycle_state()
+        for state, queryset in managers.items():
+            eq_(states[state], list(queryset))
+        eq_(states[Event.LIFECYCLE_ARCHIVED], [])
+        eq_(states[Event.LIFECYCLE_REMOVED], [])
+        Approval.objects.create(event=events[Event.LIFECYCLE_LIVE])
+        eq_(Event.objects.get(id=events[Event.LIFECYCLE_LIVE].id)
+                         .lifecycle_state(), Event.LIFECYCLE_INITIATED)
  
 
 class ForeignKeyTests(TestCase):
@@ -215,3 +262,60 @@ class ForeignKeyTests(TestCase):
         eq_(oldslug.event, event)
         self._successful_delete(event)
         self._refresh_ok(oldslug, exists=False)
+
+
+class EventPageBundleTests(TestCase):
+    fixtures = ['airmozilla/manage/tests/main_testdata.json']
+
+    def setUp(self):
+        cache.clear()
+
+    def test_constant_queries(self):
+        """The event page data costs the same number of queries however
+           many participants and tags the event has, and none once
+           cached."""
+        with self.assertNumQueries(3):
+            bundle = Event.objects.page_bundle(22)
+        eq_(len(bundle['participants']), 1)
+        eq_(len(bundle['tags']), 1)
+        event = Event.objects.get(id=22)
+        for i in range(5):
+            event.tags.add(Tag.objects.create(name='tag %d' % i))
+            event.participants.add(Participant.objects.create(
+                name='Participant %d' % i,
+                cleared=Participant.CLEARED_YES
+            ))
+        with self.assertNumQueries(3):
+            bundle = Event.objects.page_bundle(22)
+        eq_(len(bundle['participants']), 6)
+        eq_(len(bundle['tags']), 6)
+        with self.assertNumQueries(0):
+            Event.objects.page_bundle(22)
+
+    def test_invalidation(self):
+        """Approvals and related objects refresh the cached bundle."""
+        ok_(not Event.objects.page_bundle(22)['pending_approval'])
+        approval = Approval.objects.create(event_id=22)
+        ok_(Event.objects.page_bundle(22)['pending_approval'])
+        approval.approved = approval.processed = True
+        approval.save()
+        ok_(not Event.objects.page_bundle(22)['pending_approval'])
+        event = Event.objects.page_bundle(22)['event']
+        event.location.name = 'Elsewhere'
+        event.location.save()
+        eq_(Event.objects.page_bundle(22)['event'].location.name, 'Elsewhere')
+
+    def test_approval_state_update(self):
+        """Approval states written in bulk refresh the cached event data
+           and calendar months."""
+        event = Event.objects.get(id=22)
+        day = datetime.timedelta(days=1)
+        start, end = event.start_time - day, event.start_time + day
+        ok_(not Event.objects.page_bundle(22)['pending_approval'])
+        eq_([e.id for e in
+             Event.objects.calendar_range(event.public, start, end)], [22])
+        # bulk_create() sends no signals, like a backfill after a migration.
+        Approval.objects.bulk_create([Approval(event_id=22)])
+        call_command('backfill_approval_state')
+        ok_(Event.objects.page_bundle(22)['pending_approval'])
+        eq_(Event.objects.calendar_range(event.public, start, end), [])
@@ -0,0 +1,100 @@
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.test import TestCase
+
+import mock
+from nose.tools import eq_, ok_
+from sorl.thumbnail import delete, get_thumbnail
+
+from airmozilla.main.models import Event, Participant
+from airmozilla.main.thumbnails import (GEOMETRIES, ThumbnailBatch,
+                                        get_thumbnails, lookup_thumbnails,
+                                        thumbnail_pool, thumbnail_specs)
+
+
+def save_image():
+    """Stores a copy of a test image, for delete() to remove with its
+       thumbnails."""
+    with open('airmozilla/manage/tests/firefox.png', 'rb') as fp:
+        return default_storage.save('tests/firefox.png', File(fp))
+
+
+class ThumbnailsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.image = save_image()
+
+    def tearDown(self):
+        delete(self.image)
+
+    def test_same_as_get_thumbnail(self):
+        """The batch resolves the thumbnails get_thumbnail() would."""
+        expected = get_thumbnail(self.image, '32x32', crop='center')
+        thumb, = get_thumbnails([(self.image, '32x32', {'crop': 'center'})])
+        eq_(thumb.name, expected.name)
+        eq_((thumb.width, thumb.height), (expected.width, expected.height))
+
+    def test_no_queries_once_cached(self):
+        """Generated thumbnails are then looked up in one cache call."""
+        specs = [(self.image, '32x32', {}), (self.image, '68x68', {}),
+                 (self.image, '32x32', {})]
+        first = get_thumbnails(specs)
+        cache.clear()
+        with self.assertNumQueries(1):
+            get_thumbnails(specs)
+        with self.assertNumQueries(0):
+            second = get_thumbnails(specs)
+        eq_([t.name for t in second], [t.name for t in first])
+        eq_(second[0].name, second[2].name)
+
+    def test_no_file(self):
+        eq_(get_thumbnails([('', '32x32', {})]), [None])
+
+    def test_batch_resolves_pending_together(self):
+        """Queued thumbnails are resolved by the first get()."""
+        batch = ThumbnailBatch()
+        batch.add(self.image, '32x32')
+        batch.add(self.image, '68x68', crop='center')
+        with mock.patch('airmozilla.main.thumbnails.get_thumbnails',
+                        wraps=get_thumbnails) as mocked:
+            thumb = batch.get(self.image, '32x32')
+            ok_(batch.get(self.image, '68x68', crop='center'))
+            eq_(batch.get(self.image, '32x32'), thumb)
+        eq_(mocked.call_count, 1)
+        eq_(len(mocked.call_args[0][0]), 2)
+
+
+class PregenerateTests(TestCase):
+    fixtures = ['airmozilla/manage/tests/main_testdata.json']
+
+    def setUp(self):
+        cache.clear()
+        self.image = save_image()
+
+    def tearDown(self):
+        delete(self.image)
+
+    def test_no_workers_in_tests(self):
+        """settings_test.py makes saves generate thumbnails themselves."""
+        eq_(thumbnail_pool.size, 0)
+
+    def test_generated_on_save(self):
+        """Every registered geometry is generated for a new image."""
+        participant = Participant.objects.create(name='Jane Doe',
+                                                 photo=self.image)
+        specs = thumbnail_specs(participant.photo,
+                                GEOMETRIES[('participant', 'photo')])
+        ok_(all(lookup_thumbnails(specs)))
+
+    def test_unchanged_image(self):
+        """Saving an event without a new image generates nothing."""
+        event = Event.objects.get(id=22)
+        with mock.patch.object(thumbnail_pool, 'submit') as submit:
+            event.title = 'Changed'
+            event.save()
+            eq_(submit.call_count, 0)
+            event.placeholder_img = 'placeholders/other.gif'
+            event.save()
+            eq_(submit.call_count, 1)
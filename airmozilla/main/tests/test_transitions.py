@@ -0,0 +1,53 @@
+import datetime
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils.timezone import utc
+
+from nose.tools import eq_, ok_
+
+from airmozilla.main import transitions
+from airmozilla.main.models import Event
+
+
+class TestTransitions(TestCase):
+    fixtures = ['airmozilla/manage/tests/main_testdata.json']
+
+    def setUp(self):
+        self.now = datetime.datetime.utcnow().replace(tzinfo=utc)
+        self.event = Event.objects.get(id=22)
+        self.event.start_time = self.now + datetime.timedelta(minutes=30)
+        self.event.archive_time = self.now + datetime.timedelta(hours=2)
+        self.event.save()
+
+    def test_heap_order(self):
+        """Transitions come out of the heap in time order."""
+        heap = transitions.transitions(self.now,
+                                       self.now + datetime.timedelta(days=1))
+        found = [transition for instant, id, public, transition in
+                 sorted(heap)]
+        eq_(found, [transitions.TRANSITION_LIVE,
+                    transitions.TRANSITION_STARTED,
+                    transitions.TRANSITION_ARCHIVED])
+        eq_(transitions.transitions(self.now,
+                                    self.now + datetime.timedelta(minutes=1)),
+            [])
+
+    def test_invalidation(self):
+        """Only the caches of the event's visibility are invalidated."""
+        cache.set_many({'sidebar_public': 1, 'sidebar_all': 1,
+                        'home_pages_public': 1})
+        count = transitions.run_transitions(
+            self.now + datetime.timedelta(minutes=10),
+            self.now + datetime.timedelta(minutes=25)
+        )
+        eq_(count, 1)
+        ok_(cache.get('sidebar_public') is None)
+        ok_(cache.get('sidebar_all') is None)
+        eq_(cache.get('home_pages_public'), 1)
+        self.event.public = False
+        self.event.save()
+        cache.set('sidebar_public', 1)
+        transitions.run_transitions(self.now, self.now +
+                                    datetime.timedelta(minutes=25))
+        eq_(cache.get('sidebar_public'), 1)
@@ -1,14 +1,23 @@
 import datetime
+import gzip
+import mock
+import re
 import uuid
+from cStringIO import StringIO
 
 from django.contrib.auth.models import Group
+from django.core.cache import cache
 from django.test import TestCase
+from django.test.client import Client
 from django.utils.timezone import utc
 
 from funfactory.urlresolvers import reverse
 from nose.tools import eq_, ok_
 
-from airmozilla.main.models import Approval, Event, EventOldSlug, Participant
+from airmozilla.base.cache import get_tagged
+from airmozilla.main import ical
+from airmozilla.main.models import (Approval, Event, EventOldSlug,
+                                    Participant, Template)
 
 
 class TestPages(TestCase):
@@ -30,6 +39,70 @@ class TestPages(TestCase):
                                               kwargs={'page': 10000}))
         eq_(response_empty_page.status_code, 200)
 
+    def test_home_pages(self):
+        """The archive pages through (archive_time, id) cursors; numbered
+           pages seek through the page index."""
+        cache.clear()
+        event = Event.objects.get(title='Test event')
+        now = datetime.datetime.utcnow().replace(tzinfo=utc)
+        keys = []
+        for i in range(25):
+            event.pk = None
+            event.slug = 'archived-%d' % i
+            event.start_time = now - datetime.timedelta(days=2)
+            event.archive_time = now - datetime.timedelta(hours=i // 2 + 1)
+            event.save()
+            keys.append((event.archive_time, event.id))
+        expected = [id for archive_time, id in sorted(keys, reverse=True)]
+
+        def listed(response):
+            eq_(response.status_code, 200)
+            return [int(id) for id in
+                    re.findall(r'id="event-(\d+)"', response.content)]
+
+        def link(response, direction):
+            found = re.search(r'\?%s=([\d.]+)' % direction,
+                              response.content)
+            return found and found.group(1)
+
+        first = self.client.get(reverse('main:home'))
+        eq_(listed(first), expected[:10])
+        ok_(not link(first, 'after'))
+        second = self.client.get(reverse('main:home'),
+                                 {'before': link(first, 'before')})
+        eq_(listed(second), expected[10:20])
+        eq_(listed(self.client.get(reverse('main:home'),
+                                   {'after': link(second, 'after')})),
+            expected[:10])
+        for page, events in ((2, expected[10:20]), (3, expected[20:]),
+                             (4, expected[20:])):
+            response = self.client.get(reverse('main:home',
+                                               kwargs={'page': page}))
+            eq_(listed(response), events)
+        ok_(not link(response, 'before'))
+
+    def test_home_page_index_kept(self):
+        """The page index is only rebuilt when an archived event changes,
+           as rebuilding it reads the whole archive."""
+        cache.clear()
+        live = Event.objects.get(title='Test event')
+        archived = Event.objects.get(title='Test event')
+        archived.pk = None
+        archived.slug = 'archived'
+        now = datetime.datetime.utcnow().replace(tzinfo=utc)
+        archived.start_time = now - datetime.timedelta(days=2)
+        archived.archive_time = now - datetime.timedelta(days=1)
+        archived.save()
+        response = self.client.get(reverse('main:home', kwargs={'page': 2}))
+        eq_(response.status_code, 200)
+        ok_(get_tagged('home_pages_public') is not None)
+        live.title = 'Still live'
+        live.save()
+        ok_(get_tagged('home_pages_public') is not None)
+        archived.title = 'Renamed'
+        archived.save()
+        ok_(get_tagged('home_pages_public') is None)
+
     def test_event(self):
         """Event view page loads correctly if the event is public and
            scheduled and approved; request a login otherwise."""
@@ -68,6 +141,29 @@ class TestPages(TestCase):
             reverse('main:event', kwargs={'slug': old_event_slug.event.slug})
         )
 
+    def test_slug_cache(self):
+        """Unknown slugs 404 from cache; renaming an event redirects the
+           old slug and serves the new one."""
+        missing = reverse('main:event', kwargs={'slug': 'no-such-event'})
+        eq_(self.client.get(missing).status_code, 404)
+        with self.assertNumQueries(0):
+            Event.objects.resolve_slug('no-such-event')
+        event = Event.objects.get(title='Test event')
+        old_slug = event.slug
+        self.client.get(reverse('main:event', kwargs={'slug': old_slug}))
+        event.slug = 'no-such-event'
+        event.save()
+        response = self.client.get(missing)
+        eq_(response.status_code, 200)
+        response = self.client.get(
+            reverse('main:event', kwargs={'slug': old_slug})
+        )
+        self.assertRedirects(response, missing)
+        response = self.client.get(
+            reverse('main:event', kwargs={'slug': 'test-old-slug'})
+        )
+        self.assertRedirects(response, missing)
+
     def test_participant(self):
         """Participant pages always respond successfully."""
         participant = Participant.objects.get(name='Tim Mickel')
@@ -80,6 +176,51 @@ class TestPages(TestCase):
         response_ok = self.client.get(participant_page)
         eq_(response_ok.status_code, 200)
 
+    def test_anonymous_page_cache(self):
+        """Anonymous visitors share cached pages, each with their own CSRF
+           token, until what the page shows changes."""
+        participant = Participant.objects.get(name='Tim Mickel')
+        url = reverse('main:participant', kwargs={'slug': participant.slug})
+        token = re.compile(r'name=[\'"]csrfmiddlewaretoken[\'"] '
+                           r'value=[\'"]([^\'"]+)')
+        first = self.client.get(url)
+        ok_('Tim Mickel' in first.content)
+        Participant.objects.filter(id=participant.id).update(name='Updated')
+        other = Client()
+        second = other.get(url)
+        ok_('Tim Mickel' in second.content)
+        ok_('__CSRF_TOKEN__' not in second.content)
+        ok_(token.search(second.content))
+        eq_(token.search(second.content).group(1),
+            token.search(other.get(url).content).group(1))
+        participant = Participant.objects.get(id=participant.id)
+        participant.save()
+        ok_('Updated' in self.client.get(url).content)
+
+    def test_dynamic_embed_not_cached(self):
+        """Pages with an embed rendered for the request are not cached."""
+        cache.clear()
+        template = Template.objects.get(id=1)
+        template.content = '{{ md5(datetime|string) }}'
+        template.save()
+        event = Event.objects.get(title='Test event')
+        event.save()
+        url = reverse('main:event', kwargs={'slug': event.slug})
+        with mock.patch('airmozilla.main.views.render_event_template',
+                        return_value='embed') as render:
+            eq_(self.client.get(url).status_code, 200)
+            eq_(self.client.get(url).status_code, 200)
+        eq_(render.call_count, 2)
+
+    def test_page_cache_ignores_other_params(self):
+        """Only the parameters a page uses make a new cache entry."""
+        cache.clear()
+        url = reverse('main:home')
+        ok_('Test event' in self.client.get(url).content)
+        Event.objects.filter(title='Test event').update(title='Updated')
+        ok_('Test event' in self.client.get(url, {'utm': 'x'}).content)
+        ok_('Updated' in self.client.get(url, {'before': 'x'}).content)
+
     def test_participant_clear(self):
         """Visiting a participant clear token page changes the Participant
            status as expected."""
@@ -110,3 +251,135 @@ class TestPages(TestCase):
         response_changed = self.client.get(reverse('main:calendar'))
         ok_(response_changed.content != response_public.content)
         ok_('cache clear' in response_changed.content)
+
+    def test_calendar_fragments(self):
+        """Saving an event only re-serializes that event's entry."""
+        now = datetime.datetime.utcnow().replace(tzinfo=utc)
+        for i in range(3):
+            Event.objects.create(
+                title='Event %d' % i, description='Event',
+                status=Event.STATUS_SCHEDULED, public=True,
+                start_time=now - datetime.timedelta(days=i + 1),
+                placeholder_img='placeholders/Strawberry.gif'
+            )
+        self.client.get(reverse('main:calendar'))
+        event = Event.objects.get(title='Event 1')
+        event.title = 'Event one'
+        event.save()
+        with mock.patch('airmozilla.main.ical.serialize_vevent',
+                        side_effect=ical.serialize_vevent) as serialize:
+            response = self.client.get(reverse('main:calendar'))
+        eq_(serialize.call_count, 1)
+        ok_('Event one' in response.content)
+        ok_('Event 2' in response.content)
+
+    def test_calendar_conditional_get(self):
+        """Unchanged feeds answer conditional requests with 304."""
+        url = reverse('main:calendar')
+        response = self.client.get(url)
+        eq_(response.status_code, 200)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        eq_(response.status_code, 304)
+        eq_(response.content, '')
+        response = self.client.get(url,
+                                   HTTP_IF_MODIFIED_SINCE=last_modified)
+        eq_(response.status_code, 304)
+        response = self.client.get(reverse('main:private_calendar'),
+                                   HTTP_IF_NONE_MATCH=etag)
+        eq_(response.status_code, 200)
+        event = Event.objects.get(title='Test event')
+        event.title = 'Changed'
+        event.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        eq_(response.status_code, 200)
+        ok_(response['ETag'] != etag)
+
+    def test_calendar_change_not_forgotten(self):
+        """Losing the time of the last change never makes a feed look
+           older than it was served."""
+        url = reverse('main:calendar')
+        last_modified = self.client.get(url)['Last-Modified']
+        cache.clear()
+        later = (datetime.datetime.utcnow().replace(tzinfo=utc) +
+                 datetime.timedelta(hours=1))
+        with mock.patch('airmozilla.main.models._get_now',
+                        return_value=later):
+            response = self.client.get(url,
+                                       HTTP_IF_MODIFIED_SINCE=last_modified)
+        eq_(response.status_code, 200)
+
+    def test_calendar_range_read_once(self):
+        """A filtered feed looks up its events once per request."""
+        today = datetime.datetime.utcnow().date()
+        with mock.patch.object(Event.objects, 'calendar_range',
+                               wraps=Event.objects.calendar_range) as found:
+            response = self.client.get(reverse('main:calendar'),
+                                       {'start': str(today)})
+        eq_(response.status_code, 200)
+        eq_(found.call_count, 1)
+
+    def test_calendar_range(self):
+        """Calendars can be requested for a date range and filtered."""
+        url = reverse('main:calendar')
+        today = datetime.datetime.utcnow().date()
+        day = datetime.timedelta(days=1)
+        window = {'start': str(today - day), 'end': str(today + day)}
+        response = self.client.get(url, window)
+        eq_(response.status_code, 200)
+        ok_('Test event' in response.content)
+        for filters, found in (({'category': 7}, True),
+                               ({'category': 8}, False),
+                               ({'location': 1}, True),
+                               ({'tag': 1}, True),
+                               ({'tag': 2}, False)):
+            filters.update(window)
+            response = self.client.get(url, filters)
+            eq_('Test event' in response.content, found)
+        response = self.client.get(url, {'start': str(today + 2 * day)})
+        ok_('Test event' not in response.content)
+        response = self.client.get(url, {'start': 'yesterday'})
+        eq_(response.status_code, 400)
+        # moving the event refreshes both the old and the new month
+        event = Event.objects.get(title='Test event')
+        event.start_time += datetime.timedelta(days=60)
+        event.save()
+        response = self.client.get(url, window)
+        ok_('Test event' not in response.content)
+        later = today + datetime.timedelta(days=60)
+        response = self.client.get(url, {'start': str(later),
+                                         'end': str(later)})
+        ok_('Test event' in response.content)
+
+    def test_calendar_range_location_renamed(self):
+        """Ranged feeds show the new name of a renamed location."""
+        url = reverse('main:calendar')
+        today = datetime.datetime.utcnow().date()
+        day = datetime.timedelta(days=1)
+        window = {'start': str(today - day), 'end': str(today + day)}
+        response = self.client.get(url, window)
+        event = Event.objects.get(title='Test event')
+        ok_(event.location.name in response.content)
+        etag = response['ETag']
+        event.location.name = 'Renamed Location'
+        event.location.save()
+        response = self.client.get(url, window, HTTP_IF_NONE_MATCH=etag)
+        eq_(response.status_code, 200)
+        ok_('Renamed Location' in response.content)
+
+    def test_calendar_gzip(self):
+        """Cached feeds are served gzipped to clients accepting it."""
+        url = reverse('main:calendar')
+        response = self.client.get(url)
+        plain = self.client.get(url)
+        eq_(plain.content, response.content)
+        ok_(not plain.has_header('Content-Encoding'))
+        eq_(plain['Content-Type'], 'text/calendar; charset=utf-8')
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        eq_(compressed['Content-Encoding'], 'gzip')
+        eq_(compressed['Vary'], 'Accept-Encoding')
+        ok_('filename=AirMozillaEventsPublic.ics' in
+            compressed['Content-Disposition'])
+        content = gzip.GzipFile(fileobj=StringIO(compressed.content)).read()
+        eq_(content, plain.content)
@@ -0,0 +1,221 @@
+"""Batched thumbnail lookups.
+
+sorl's get_thumbnail() asks the key value store for each thumbnail on its
+own, which on list pages means one memcached round-trip (and a query on a
+cache miss) per image.  The functions here resolve many thumbnails with a
+single read from our key value store (airmozilla.base.kvstore), and only
+fall back to get_thumbnail() for thumbnails that have not been generated
+yet.
+
+The thumbnails the templates use are also generated ahead of time, in a
+pool of worker threads, whenever an image is saved."""
+import logging
+import Queue
+import threading
+
+from django.conf import settings as django_settings
+from django.db import connection
+
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import settings, defaults as default_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+
+# The thumbnails used by the templates, by model and image field, as
+# (geometry, options).  Keep in sync with the thumbnail() calls.
+GEOMETRIES = {
+    ('event', 'placeholder_img'): (
+        ('160x160', {'crop': 'center'}),
+        ('120x120', {}),
+        ('68x68', {'crop': 'center'}),
+        ('64x64', {'crop': 'center'}),
+        ('32x32', {}),
+    ),
+    ('participant', 'photo'): (
+        ('150x150', {}),
+        ('32x32', {}),
+    ),
+}
+
+log = logging.getLogger('airmozilla.thumbnails')
+
+
+def _options(options):
+    """The options get_thumbnail() would use, defaults included, so that
+       the same file name is computed."""
+    options = dict(options)
+    for key, value in ThumbnailBackend.default_options.iteritems():
+        options.setdefault(key, value)
+    for key, attr in ThumbnailBackend.extra_options:
+        value = getattr(settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def _thumbnail_file(file_, geometry, options):
+    source = ImageFile(file_)
+    name = default.backend._get_thumbnail_filename(
+        source, geometry, _options(options)
+    )
+    return ImageFile(name, default.storage)
+
+
+def _generate(file_, geometry, options):
+    try:
+        return get_thumbnail(file_, geometry, **options)
+    except IOError:
+        return None
+
+
+def lookup_thumbnails(specs):
+    """The already generated thumbnails for a list of (file, geometry,
+       options) tuples, with None for the others."""
+    results = [None] * len(specs)
+    get_many = getattr(default.kvstore, '_get_many_raw', None)
+    if get_many is None:
+        # Only our key value store can be read in bulk.
+        return results
+
+    keys = {}
+    for i, (file_, geometry, options) in enumerate(specs):
+        if not file_:
+            continue
+        thumbnail = _thumbnail_file(file_, geometry, options)
+        keys.setdefault(add_prefix(thumbnail.key), []).append(i)
+
+    values = get_many(keys.keys()) if keys else {}
+    for key, indexes in keys.iteritems():
+        value = values[key]
+        if value is None:
+            continue
+        thumbnail = deserialize_image_file(value)
+        for i in indexes:
+            results[i] = thumbnail
+    return results
+
+
+def get_thumbnails(specs):
+    """Returns the thumbnails for a list of (file, geometry, options)
+       tuples, in order, with None for missing files and the ones that
+       cannot be read."""
+    results = lookup_thumbnails(specs)
+    for i, (file_, geometry, options) in enumerate(specs):
+        if file_ and results[i] is None:
+            # Not generated yet.
+            results[i] = _generate(file_, geometry, options)
+    return results
+
+
+def _spec_key(file_, geometry, options):
+    name = getattr(file_, 'name', file_)
+    return (name, geometry, tuple(sorted(options.items())))
+
+
+class ThumbnailBatch(object):
+    """Thumbnails requested for one page.  Thumbnails are queued with
+       add() and all the pending ones are resolved together the first
+       time get() asks for one that is not known yet, so a page whose
+       cached fragments never ask for a thumbnail does no lookups."""
+
+    def __init__(self):
+        self._pending = {}
+        self._resolved = {}
+
+    def add(self, file_, geometry, **options):
+        key = _spec_key(file_, geometry, options)
+        if key not in self._resolved:
+            self._pending[key] = (file_, geometry, options)
+
+    def get(self, file_, geometry, **options):
+        key = _spec_key(file_, geometry, options)
+        if key not in self._resolved:
+            self._pending[key] = (file_, geometry, options)
+            pending = self._pending.items()
+            self._pending = {}
+            thumbnails = get_thumbnails([spec for __, spec in pending])
+            for (spec_key, __), thumbnail in zip(pending, thumbnails):
+                self._resolved[spec_key] = thumbnail
+        return self._resolved[key]
+
+
+def request_batch(request):
+    """The ThumbnailBatch shared by everything rendered for a request."""
+    if request is None:
+        return ThumbnailBatch()
+    try:
+        return request._thumbnail_batch
+    except AttributeError:
+        request._thumbnail_batch = ThumbnailBatch()
+        return request._thumbnail_batch
+
+
+def image_fields(model):
+    """The registered image fields of a model, with their geometries."""
+    name = model._meta.module_name
+    return dict((field, geometries)
+                for (model_name, field), geometries in GEOMETRIES.iteritems()
+                if model_name == name)
+
+
+def thumbnail_specs(image, geometries):
+    return [(image, geometry, options) for geometry, options in geometries]
+
+
+def generate_missing(specs):
+    """Generates the thumbnails that do not exist yet and returns them."""
+    generated = []
+    thumbnails = lookup_thumbnails(specs)
+    for (file_, geometry, options), thumbnail in zip(specs, thumbnails):
+        if file_ and thumbnail is None:
+            thumbnail = _generate(file_, geometry, options)
+            if thumbnail is not None:
+                generated.append(thumbnail)
+    return generated
+
+
+class ThumbnailPool(object):
+    """Daemon threads generating thumbnails off the request path.  With a
+       size of 0 thumbnails are generated right away instead."""
+
+    def __init__(self, size):
+        self.size = size
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            while len(self._threads) < self.size:
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            specs = self._queue.get()
+            try:
+                generate_missing(specs)
+            except Exception:
+                log.exception('Failed to generate thumbnails')
+            finally:
+                # Each thread has its own connection; do not keep it open
+                # while idle.
+                connection.close()
+                self._queue.task_done()
+
+    def submit(self, specs):
+        if not self.size:
+            generate_missing(specs)
+            return
+        self._start()
+        self._queue.put(specs)
+
+    def join(self):
+        """Waits until every submitted thumbnail has been handled."""
+        self._queue.join()
+
+
+thumbnail_pool = ThumbnailPool(django_settings.THUMBNAIL_PREGENERATE_WORKERS)
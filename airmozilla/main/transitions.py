@@ -0,0 +1,79 @@
+"""Changes of event state which happen as time passes, without the event
+being saved: going live LIVE_MARGIN minutes before the start time,
+starting, and being archived at the archive time.  The event_transitions
+command invalidates what each of them changes as it happens."""
+import datetime
+import heapq
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from airmozilla.base.cache import PAGES_TAG, invalidate_tags
+from airmozilla.main.models import Event, touch_calendars
+
+
+TRANSITION_LIVE = 'live'
+TRANSITION_STARTED = 'started'
+TRANSITION_ARCHIVED = 'archived'
+
+
+def transitions(since, until):
+    """Returns a heap of (instant, event id, public, transition) for the
+       transitions of approved events after `since` up to `until`."""
+    margin = datetime.timedelta(minutes=settings.LIVE_MARGIN)
+    events = (
+        Event.objects.approved()
+             .filter(Q(start_time__gt=since, start_time__lte=until + margin) |
+                     Q(archive_time__gt=since, archive_time__lte=until))
+             .values_list('id', 'public', 'start_time', 'archive_time')
+    )
+    heap = []
+    for id, public, start_time, archive_time in events:
+        for transition, instant in ((TRANSITION_LIVE, start_time - margin),
+                                    (TRANSITION_STARTED, start_time),
+                                    (TRANSITION_ARCHIVED, archive_time)):
+            if instant is not None and since < instant <= until:
+                heap.append((instant, id, public, transition))
+    heapq.heapify(heap)
+    return heap
+
+
+def transition_cache_keys(public, transition):
+    """Cache keys whose content changes with a transition of an event."""
+    if transition == TRANSITION_STARTED:
+        # Moves the event from the upcoming to the past part of its feed.
+        return ['calendar_public' if public else 'calendar_private',
+                'calendar_public_validator' if public else
+                'calendar_private_validator']
+    if transition == TRANSITION_LIVE:
+        # Takes the event out of the upcoming events in the sidebar.
+        keys = ['sidebar_all']
+        if public:
+            keys.append('sidebar_public')
+        return keys
+    # Adds the event to the archive pages.
+    keys = ['home_pages_all']
+    if public:
+        keys.append('home_pages_public')
+    return keys
+
+
+def apply_transition(public, transition):
+    cache.delete_many(transition_cache_keys(public, transition))
+    if public:
+        # Anonymous pages show public events only.
+        invalidate_tags(PAGES_TAG)
+    if transition == TRANSITION_STARTED:
+        touch_calendars(public)
+
+
+def run_transitions(since, until):
+    """Applies the transitions after `since` up to `until`, in order, and
+       returns how many there were."""
+    heap = transitions(since, until)
+    count = len(heap)
+    while heap:
+        instant, id, public, transition = heapq.heappop(heap)
+        apply_transition(public, transition)
+    return count
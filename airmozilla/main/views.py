@@ -1,36 +1,75 @@
 import datetime
 import hashlib
-import vobject
 
 from django import http
 from django.conf import settings
 from django.contrib.sites.models import RequestSite
 from django.shortcuts import get_object_or_404, redirect, render
-from django.core.cache import cache
 from django.utils.timezone import utc
+from django.views.decorators.http import condition
 
-from jingo import Template
-
-from airmozilla.main.models import Event, EventOldSlug, Participant
-from airmozilla.base.utils import paginate
+from airmozilla.main.embed import compiled_templates, render_event_template
+from airmozilla.main.forms import CalendarForm
+from airmozilla.main.ical import serialize_calendar, vevent_fragments
+from airmozilla.main.models import (ARCHIVE_TAG, Event, Location,
+                                    Participant, _get_now, calendar_changed,
+                                    events_tag, object_tag)
+from airmozilla.base.cache import (add_tags, cache_anonymous_page,
+                                   cache_response, cached_response,
+                                   get_tagged, set_tagged, skip_page_cache)
+from airmozilla.base.utils import decode_cursor, keyset_paginate
 
 
+@cache_anonymous_page()
 def page(request, template):
     """Base page:  renders templates bare, used for static pages."""
     return render(request, template)
 
 
+def _home_page_index(events, public):
+    """Keys of the last event of each archive page but the final one, so
+       that /page/N/ can seek directly to its page.  Building it reads the
+       key of every archived event, so it is cached until an archived
+       event changes or the next event is archived, not on every edit."""
+    cache_key = 'home_pages_%s' % ('public' if public else 'all')
+    index = get_tagged(cache_key)
+    if index is None:
+        size = settings.HOME_PAGE_SIZE
+        keys = list(events.order_by('-archive_time', '-id')
+                          .values_list('archive_time', 'id'))
+        index = keys[size - 1:-1:size]
+        timeout = settings.HOME_PAGE_INDEX_TIMEOUT
+        next_archived = (Event.objects.approved()
+                         .filter(archive_time__gt=_get_now())
+                         .order_by('archive_time')
+                         .values_list('archive_time', flat=True)[:1])
+        for archive_time in next_archived:
+            until = archive_time - _get_now()
+            timeout = min(timeout, until.days * 86400 + until.seconds + 1)
+        set_tagged(cache_key, index, [ARCHIVE_TAG], max(timeout, 1))
+    return index
+
+
+@cache_anonymous_page(events_tag(True), params=('before', 'after'))
 def home(request, page=1):
     """Paginated recent videos and live videos."""
     if request.user.is_active:
         public_filter = {}
     else:
         public_filter = {'public': True}
-    archived_events = (Event.objects.archived().filter(**public_filter)
-                       .order_by('-archive_time'))
+    archived_events = Event.objects.archived().filter(**public_filter)
     live_events = (Event.objects.live().filter(**public_filter)
                    .order_by('start_time'))
-    archived_paged = paginate(archived_events, page, 10)
+    before = decode_cursor(request.GET.get('before'))
+    after = decode_cursor(request.GET.get('after'))
+    page = int(page)
+    if page > 1 and not (before or after):
+        index = _home_page_index(archived_events, bool(public_filter))
+        if index:
+            before = index[min(page, len(index) + 1) - 2]
+    archived_paged = keyset_paginate(archived_events, 'archive_time',
+                                     settings.HOME_PAGE_SIZE,
+                                     before=before, after=after)
     live = None
     also_live = []
     if live_events:
@@ -42,13 +81,20 @@ def home(request, page=1):
     })
 
 
+@cache_anonymous_page()
 def event(request, slug):
     """Video, description, and other metadata."""
+    resolved = Event.objects.resolve_slug(slug)
+    if not resolved:
+        raise http.Http404('No event with slug %s' % slug)
+    event_id, event_slug = resolved
+    if event_slug != slug:
+        return redirect('main:event', slug=event_slug)
     try:
-        event = Event.objects.get(slug=slug)
+        bundle = Event.objects.page_bundle(event_id)
     except Event.DoesNotExist:
-        old_slug = get_object_or_404(EventOldSlug, slug=slug)
-        return redirect('main:event', slug=old_slug.event.slug)
+        raise http.Http404('No event with slug %s' % slug)
+    event = bundle['event']
     if not event.public and not request.user.is_active:
         return redirect('main:login')
     warning = None
@@ -57,35 +103,34 @@ def event(request, slug):
             return http.HttpResponse('Event not scheduled')
         else:
             warning = "Event is not publicly visible - not scheduled."
-    if event.approval_set.filter(approved=False).exists():
+    if bundle['pending_approval']:
         if not request.user.is_active:
             return http.HttpResponse('Event not approved')
         else:
             warning = "Event is not publicly visible - not yet approved."
     template_tagged = ''
     if event.template and not event.is_upcoming():
-        context = {
-            'md5': lambda s: hashlib.md5(s).hexdigest(),
-            'event': event,
-            'request': request,
-            'datetime': datetime.datetime.utcnow()
-        }
-        if isinstance(event.template_environment, dict):
-            context.update(event.template_environment)
-        template = Template(event.template.content)
-        template_tagged = template.render(context)
-    participants = event.participants.filter(cleared=Participant.CLEARED_YES)
+        # Stored at save time unless the template depends on the request.
+        template_tagged = event.template_rendered
+        if not template_tagged:
+            template_tagged = render_event_template(event, request)
+            if compiled_templates.is_dynamic(event.template):
+                # Rendered for this visitor and time; not to be shared.
+                skip_page_cache()
     return render(request, 'main/event.html', {
         'event': event,
         'video': template_tagged,
-        'participants': participants,
+        'participants': bundle['participants'],
+        'tags': bundle['tags'],
         'warning': warning
     })
 
 
+@cache_anonymous_page()
 def participant(request, slug):
     """Individual participant/speaker profile."""
     participant = get_object_or_404(Participant, slug=slug)
+    add_tags(object_tag(participant, participant.id))
     return render(request, 'main/participant.html', {
         'participant': participant,
     })
@@ -104,38 +149,164 @@ def participant_clear(request, clear_token):
         })
 
 
+def _calendar_events(public):
+    """Approved events in the feed window: the CALENDAR_SIZE most recent
+       past events and the CALENDAR_SIZE next upcoming events."""
+    now = datetime.datetime.utcnow().replace(tzinfo=utc)
+    past = (Event.objects.approved()
+            .filter(start_time__lt=now, public=public)
+            .select_related('location')
+            .order_by('-start_time')[:settings.CALENDAR_SIZE])
+    upcoming = (Event.objects.approved()
+                .filter(start_time__gte=now, public=public)
+                .select_related('location')
+                .order_by('start_time')[:settings.CALENDAR_SIZE])
+    return past, upcoming
+
+
+def _calendar_filters(request):
+    """The date range and filters a feed was requested with, None for the
+       default window.  Raises ValueError on invalid parameters."""
+    form = CalendarForm(request.GET)
+    if not form.is_valid():
+        raise ValueError(form.errors)
+    data = form.cleaned_data
+    if all(value is None for value in data.values()):
+        return None
+    if data['start']:
+        start = datetime.datetime.combine(data['start'], datetime.time())
+        start = start.replace(tzinfo=utc)
+    else:
+        start = (datetime.datetime.utcnow().replace(tzinfo=utc) -
+                 datetime.timedelta(days=settings.CALENDAR_RANGE_DAYS))
+        start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    if data['end']:
+        end = datetime.datetime.combine(data['end'], datetime.time())
+        end = end.replace(tzinfo=utc) + datetime.timedelta(days=1)
+    else:
+        end = start + datetime.timedelta(days=settings.CALENDAR_RANGE_DAYS * 2)
+    longest = datetime.timedelta(days=settings.CALENDAR_MAX_RANGE_DAYS)
+    end = min(end, start + longest)
+    return {
+        'start': start,
+        'end': end,
+        'category': data['category'],
+        'location': data['location'],
+        'tag': data['tag'],
+    }
+
+
+def _calendar_filtered_events(request, public, filters):
+    """The events of a filtered feed, looked up once per request."""
+    try:
+        return request._calendar_events
+    except AttributeError:
+        pass
+    events = Event.objects.calendar_range(public, filters['start'],
+                                          filters['end'])
+    if filters['category']:
+        events = [e for e in events if e.category_id == filters['category']]
+    if filters['location']:
+        events = [e for e in events if e.location_id == filters['location']]
+    if filters['tag']:
+        events = [e for e in events
+                  if filters['tag'] in [tag.id for tag in e.tags.all()]]
+    request._calendar_events = events
+    return events
+
+
+def _calendar_validator(request, public=True):
+    """(ETag, Last-Modified) of a calendar feed, computed once per
+       request.  The default window's is cached until an event or
+       approval changes; filtered feeds are checked against their cached
+       month blocks."""
+    try:
+        return request._calendar_validator
+    except AttributeError:
+        pass
+    try:
+        filters = _calendar_filters(request)
+    except ValueError:
+        request._calendar_validator = (None, None)
+        return request._calendar_validator
+    cache_key = 'calendar_%s_validator' % ('public' if public else 'private')
+    validator = None if filters else get_tagged(cache_key)
+    if validator is None:
+        if filters:
+            events = _calendar_filtered_events(request, public, filters)
+            rows = [(e.id, e.modified, e.start_time, e.location_id,
+                     e.location.name if e.location else None)
+                    for e in events]
+            past = []
+        else:
+            past, upcoming = _calendar_events(public)
+            fields = ('id', 'modified', 'start_time', 'location',
+                      'location__name')
+            past = list(past.values_list(*fields))
+            rows = past + list(upcoming.values_list(*fields))
+        # Feeds show the name of the location of their events.
+        etag = hashlib.md5(repr((
+            public, request.is_secure(), RequestSite(request).domain,
+            sorted(filters.items()) if filters else None,
+            [(row[0], row[1], row[4]) for row in rows]
+        ))).hexdigest()
+        # The window also changes when an event starts or gets unlisted.
+        candidates = [row[1] for row in rows]
+        if past:
+            candidates.append(past[0][2])
+        candidates.append(calendar_changed(public))
+        validator = (etag, max(candidates))
+        if not filters:
+            tags = set(object_tag(Location, row[3])
+                       for row in rows if row[3])
+            tags.add(events_tag(public))
+            set_tagged(cache_key, validator, tags)
+    request._calendar_validator = validator
+    return validator
+
+
+def _calendar_etag(request, public=True):
+    return _calendar_validator(request, public)[0]
+
+
+def _calendar_last_modified(request, public=True):
+    return _calendar_validator(request, public)[1]
+
+
+@condition(etag_func=_calendar_etag,
+           last_modified_func=_calendar_last_modified)
 def events_calendar(request, public=True):
+    """iCalendar feed of the default window of events, or of a date range
+       (`start`, `end`) optionally filtered by `category`, `location` and
+       `tag` ids."""
+    try:
+        filters = _calendar_filters(request)
+    except ValueError:
+        return http.HttpResponseBadRequest('Invalid calendar parameters.')
     cache_key = 'calendar_%s' % ('public' if public else 'private')
-    cached = cache.get(cache_key)
-    if cached:
-        return cached
-    cal = vobject.iCalendar()
-    cal.add('X-WR-CALNAME').value = ('Air Mozilla Public Events' if public
-                                     else 'Air Mozilla Private Events')
-    now = datetime.datetime.utcnow().replace(tzinfo=utc)
-    events = list(Event.objects.approved()
-                  .filter(start_time__lt=now, public=public)
-                  .order_by('-start_time')[:settings.CALENDAR_SIZE])
-    events += list(Event.objects.approved()
-                        .filter(start_time__gte=now, public=public)
-                        .order_by('start_time')[:settings.CALENDAR_SIZE])
+    if filters:
+        events = _calendar_filtered_events(request, public, filters)
+    else:
+        cached = cached_response(cache_key, request)
+        if cached:
+            return cached
+        past, upcoming = _calendar_events(public)
+        events = list(past) + list(upcoming)
     base_url = '%s://%s/' % (request.is_secure() and 'https' or 'http',
                              RequestSite(request).domain)
-    for event in events:
-        vevent = cal.add('vevent')
-        vevent.add('summary').value = event.title
-        vevent.add('dtstart').value = event.start_time
-        vevent.add('dtend').value = (event.start_time +
-                                     datetime.timedelta(hours=1))
-        vevent.add('description').value = event.description
-        if event.location:
-            vevent.add('location').value = event.location.name
-        vevent.add('url').value = base_url + event.slug + '/'
-    icalstream = cal.serialize()
+    icalstream = serialize_calendar(
+        'Air Mozilla Public Events' if public
+        else 'Air Mozilla Private Events',
+        vevent_fragments(events, base_url)
+    )
     response = http.HttpResponse(icalstream,
                                  mimetype='text/calendar; charset=utf-8')
     filename = 'AirMozillaEvents%s.ics' % ('Public' if public else 'Private')
     response['Content-Disposition'] = (
         'inline; filename=%s' % filename)
-    cache.set(cache_key, response)
+    if not filters:
+        tags = set(object_tag(Location, event.location_id)
+                   for event in events if event.location_id)
+        tags.add(events_tag(public))
+        cache_response(cache_key, response, tags=tags)
     return response
@@ -0,0 +1,77 @@
+"""Counts shown as badges in the manage navigation.
+
+Each count is kept in the cache and adjusted by the signal receivers in
+manage.models as events, approvals and participants change.  A count
+missing from the cache is computed from the database; the recount_badges
+command reconciles them all periodically."""
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+
+from airmozilla.main.models import Approval, Event, Participant
+
+
+def _key(name):
+    return 'badge_count:%s' % name
+
+
+def approvals_name(group_id):
+    return 'approvals:%s' % group_id
+
+
+def count(name):
+    """Counts a badge from the database."""
+    if name == 'events':
+        return Event.objects.initiated().count()
+    if name == 'participants':
+        return (Participant.objects.filter(cleared=Participant.CLEARED_NO)
+                                   .count())
+    if name.startswith('approvals:'):
+        group_id = int(name.split(':', 1)[1])
+        return Approval.objects.filter(group=group_id,
+                                       processed=False).count()
+    raise ValueError('Unknown badge %r' % name)
+
+
+def get_counts(names):
+    """Returns {name: count} for the badges `names`, in one cache
+       round-trip when they are all cached."""
+    keys = dict((_key(name), name) for name in names)
+    cached = cache.get_many(keys.keys())
+    counts = dict((keys[key], value) for key, value in cached.items())
+    for name in names:
+        if name not in counts:
+            counts[name] = count(name)
+            cache.add(_key(name), counts[name],
+                      settings.BADGE_COUNT_TIMEOUT)
+    return counts
+
+
+def adjust(name, delta):
+    """Adds `delta` to a cached count.  Counts not in the cache are left
+       alone; they are computed again when next read."""
+    if not delta:
+        return
+    try:
+        if delta > 0:
+            cache.incr(_key(name), delta)
+        else:
+            cache.decr(_key(name), -delta)
+    except ValueError:
+        pass
+
+
+def forget(name):
+    cache.delete(_key(name))
+
+
+def recount():
+    """Recounts every badge from the database and returns the counts."""
+    names = ['events', 'participants']
+    names += [approvals_name(group_id)
+              for group_id in Group.objects.values_list('id', flat=True)]
+    counts = dict((name, count(name)) for name in names)
+    cache.set_many(dict((_key(name), value)
+                        for name, value in counts.items()),
+                   settings.BADGE_COUNT_TIMEOUT)
+    return counts
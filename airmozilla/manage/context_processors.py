@@ -1,28 +1,31 @@
-from airmozilla.main.models import Approval, Event, Participant
+from airmozilla.manage.badges import approvals_name, get_counts
 
 
 def badges(request):
     if not request.path.startswith('/manage/'):
         return {}
-    context = {'badges': {}}
+    names = []
     # Event manager badge for unprocessed events
     if request.user.has_perm('main.change_event_others'):
-        events = Event.objects.initiated().count()
-        if events > 0:
-            context['badges']['events'] = events
+        names.append('events')
     # Approval inbox badge
+    approval_names = []
     if request.user.has_perm('main.change_approval'):
-        approvals = Approval.objects.filter(
-            group__in=request.user.groups.all(),
-            processed=False
-        ).count()
-        if approvals > 0:
-            context['badges']['approvals'] = approvals
+        approval_names = [
+            approvals_name(group_id) for group_id in
+            request.user.groups.values_list('id', flat=True)
+        ]
+        names.extend(approval_names)
     # Uncleared participants badge
     if request.user.has_perm('main.change_participant_others'):
-        participants = (
-            Participant.objects.filter(cleared=Participant.CLEARED_NO).count()
-        )
-        if participants > 0:
-            context['badges']['part_edit'] = participants
+        names.append('participants')
+    counts = get_counts(names)
+    context = {'badges': {}}
+    if counts.get('events', 0) > 0:
+        context['badges']['events'] = counts['events']
+    approvals = sum(counts[name] for name in approval_names)
+    if approvals > 0:
+        context['badges']['approvals'] = approvals
+    if counts.get('participants', 0) > 0:
+        context['badges']['part_edit'] = counts['participants']
     return context
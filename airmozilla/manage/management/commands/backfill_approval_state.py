@@ -0,0 +1,28 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from airmozilla.main.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the approval state of every event from its approvals.'
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size',
+            type='int',
+            dest='batch_size',
+            default=1000,
+            help='Number of events updated at a time.'),
+    )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = list(Event.objects.order_by('id').values_list('id', flat=True))
+        updated = 0
+        for i in range(0, len(ids), batch_size):
+            batch = ids[i:i + batch_size]
+            updated += Event.objects.update_approval_state(
+                Event.objects.filter(id__gte=batch[0], id__lte=batch[-1])
+            )
+        print "Updated the approval state of %d of %d events" % (
+            updated, len(ids))
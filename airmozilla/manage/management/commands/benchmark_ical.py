@@ -0,0 +1,63 @@
+import datetime
+import time
+import vobject
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import utc
+
+from airmozilla.main import ical
+from airmozilla.main.models import Event, Location
+
+
+class Command(BaseCommand):
+    help = ('Compares the native calendar writer with vobject on a large '
+            'synthetic feed.')
+    option_list = BaseCommand.option_list + (
+        make_option('--events',
+            type='int',
+            dest='events',
+            default=1000,
+            help='Number of events in the feed.'),
+    )
+
+    def handle(self, *args, **options):
+        base_url = 'https://air.mozilla.org/'
+        start = datetime.datetime(2012, 1, 1, tzinfo=utc)
+        location = Location(name=u'Mountain View, Warp Zone')
+        events = [
+            Event(id=i, slug='event-%d' % i,
+                  title=u'Weekly project meeting #%d, édition' % i,
+                  description=u'Agenda; notes, and links\n' * 8,
+                  start_time=start + datetime.timedelta(hours=i),
+                  location=location)
+            for i in range(options['events'])
+        ]
+
+        began = time.time()
+        cal = vobject.iCalendar()
+        cal.add('X-WR-CALNAME').value = 'Benchmark'
+        for event in events:
+            vevent = cal.add('vevent')
+            vevent.add('uid').value = '%s@air.mozilla.org' % event.id
+            vevent.add('summary').value = event.title
+            vevent.add('dtstart').value = event.start_time
+            vevent.add('dtend').value = (event.start_time +
+                                         datetime.timedelta(hours=1))
+            vevent.add('description').value = event.description
+            vevent.add('location').value = event.location.name
+            vevent.add('url').value = base_url + event.slug + '/'
+        expected = cal.serialize()
+        vobject_time = time.time() - began
+
+        began = time.time()
+        output = ical.serialize_calendar('Benchmark', [
+            ical.serialize_vevent(event, base_url) for event in events
+        ])
+        native_time = time.time() - began
+
+        print "Events:   %d (%d bytes)" % (len(events), len(output))
+        print "vobject:  %.3fs" % vobject_time
+        print "native:   %.3fs" % native_time
+        print "Speedup:  %.1fx" % (vobject_time / native_time)
+        print "Identical output: %s" % (output == expected)
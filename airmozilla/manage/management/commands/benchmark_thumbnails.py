@@ -0,0 +1,119 @@
+import multiprocessing
+import resource
+import time
+from cStringIO import StringIO
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    import Image
+    import ImageDraw
+
+from sorl.thumbnail.engines.pil_engine import Engine as StockEngine
+from sorl.thumbnail.parsers import parse_geometry
+
+from airmozilla.base.thumbnail_engine import Engine
+
+
+class _Source(object):
+    """What the engines read an image from."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+
+def _synthetic_jpeg(width, height):
+    image = Image.new('RGB', (width, height), (30, 60, 90))
+    draw = ImageDraw.Draw(image)
+    for i in range(0, width, 37):
+        draw.line((i, 0, width - i, height), fill=(i % 256, 120, 200),
+                  width=5)
+    for i in range(0, height, 53):
+        draw.ellipse((i, i / 2, i + height / 4, i / 2 + height / 4),
+                     outline=(250, i % 256, 10))
+    buf = StringIO()
+    image.save(buf, format='JPEG', quality=90)
+    return buf.getvalue()
+
+
+def _run(engine_class, data, geometry, options, repeat, results):
+    """Thumbnails the image `repeat` times in a fresh process, so that its
+       peak memory is that of the engine alone."""
+    engine = engine_class()
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    began = time.time()
+    for i in range(repeat):
+        image = engine.get_image(_Source(data))
+        ratio = engine.get_image_ratio(image)
+        thumbnail = engine.create(image, parse_geometry(geometry, ratio),
+                                  options)
+        engine._get_raw_data(thumbnail, options['format'], 95)
+    elapsed = time.time() - began
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    results.put((elapsed / repeat, peak))
+
+
+def _measure(engine_class, data, geometry, options, repeat):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_run,
+        args=(engine_class, data, geometry, options, repeat, results)
+    )
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+class Command(BaseCommand):
+    help = ('Compares the time and peak memory of thumbnailing a large '
+            'JPEG with the stock PIL engine and ours.')
+    option_list = BaseCommand.option_list + (
+        make_option('--image',
+            dest='image',
+            help='JPEG file to thumbnail instead of a synthetic one.'),
+        make_option('--size',
+            dest='size',
+            default='4000x3000',
+            help='Size of the synthetic image.'),
+        make_option('--geometry',
+            dest='geometry',
+            default='160x160',
+            help='Thumbnail geometry.'),
+        make_option('--repeat',
+            type='int',
+            dest='repeat',
+            default=5,
+            help='Number of thumbnails made with each engine.'),
+    )
+
+    def handle(self, *args, **options):
+        if options['image']:
+            with open(options['image'], 'rb') as fp:
+                data = fp.read()
+        else:
+            width, height = map(int, options['size'].split('x'))
+            data = _synthetic_jpeg(width, height)
+        size = Image.open(StringIO(data)).size
+        thumbnail_options = {
+            'format': 'JPEG',
+            'colorspace': 'RGB',
+            'crop': 'center',
+            'upscale': False,
+        }
+        args = (data, options['geometry'], thumbnail_options,
+                options['repeat'])
+        stock_time, stock_peak = _measure(StockEngine, *args)
+        draft_time, draft_peak = _measure(Engine, *args)
+
+        print "Image:    %dx%d (%d bytes) to %s" % (
+            size[0], size[1], len(data), options['geometry'])
+        print "stock:    %.3fs, peak +%d KB" % (stock_time, stock_peak)
+        print "draft:    %.3fs, peak +%d KB" % (draft_time, draft_peak)
+        print "Speedup:  %.1fx" % (stock_time / draft_time)
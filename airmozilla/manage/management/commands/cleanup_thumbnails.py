@@ -0,0 +1,203 @@
+import os
+import time
+from multiprocessing.pool import ThreadPool
+from optparse import make_option
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.utils import simplejson
+
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import deserialize, serialize
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+
+# Only files in this storage are checked; references to images stored
+# elsewhere are kept.
+FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+
+
+def _walk(top):
+    """Files under a directory of MEDIA_ROOT, relative to it, with their
+       modification time."""
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(top):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            files[os.path.relpath(path, settings.MEDIA_ROOT)] = mtime
+    return files
+
+
+def media_files(threads):
+    """All the files of MEDIA_ROOT, walking its directories in parallel."""
+    files = {}
+    tops = []
+    for name in os.listdir(settings.MEDIA_ROOT):
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        if os.path.isdir(path):
+            tops.append(path)
+        else:
+            files[name] = os.path.getmtime(path)
+    pool = ThreadPool(threads)
+    try:
+        for found in pool.imap_unordered(_walk, tops):
+            files.update(found)
+    finally:
+        pool.close()
+        pool.join()
+    return files
+
+
+def _chunks(identity, chunk_size):
+    """(key, value) of every key value store row of an identity, read a
+       chunk at a time in key order."""
+    prefix = add_prefix('', identity)
+    last = ''
+    while True:
+        rows = list(
+            KVStoreModel.objects
+            .filter(key__startswith=prefix, key__gt=last)
+            .order_by('key')
+            .values_list('key', 'value')[:chunk_size]
+        )
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+
+class Command(BaseCommand):
+    help = ('Deletes thumbnail references to images that no longer exist, '
+            'the thumbnails of those images and thumbnail files nothing '
+            'refers to.  The key and file name of every image are kept '
+            'in memory while it runs.')
+    option_list = BaseCommand.option_list + (
+        make_option('--dry-run',
+            action='store_true',
+            dest='dry_run',
+            default=False,
+            help='Only report what would be deleted.'),
+        make_option('--chunk-size',
+            type='int',
+            dest='chunk_size',
+            default=1000,
+            help='Number of keys read and deleted at a time.'),
+        make_option('--threads',
+            type='int',
+            dest='threads',
+            default=8,
+            help='Number of threads walking MEDIA_ROOT.'),
+    )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.verbosity = int(options['verbosity'])
+        chunk_size = options['chunk_size']
+        started = time.time()
+        files = media_files(options['threads'])
+        self.deleted_keys = self.deleted_files = 0
+
+        # Image references: the ones whose file is gone are deleted.  The
+        # others are kept as {key: file name}, so memory grows with the
+        # number of images.
+        live = {}
+        gone = set()
+        for rows in _chunks('image', chunk_size):
+            lost = []
+            for key, value in rows:
+                data = simplejson.loads(value)
+                if (data['storage'] == FILE_STORAGE and
+                        data['name'] not in files and
+                        not self._exists(data['name'])):
+                    # Not in the walk, and not created since either.
+                    lost.append(key)
+                    gone.add(del_prefix(key))
+                else:
+                    live[del_prefix(key)] = data['name']
+            self._delete_keys(lost)
+
+        # Thumbnail lists: dropped with the thumbnails of lost images, and
+        # rewritten without the thumbnails that are gone.  Images stored
+        # since their chunk was read are not known yet, and are left alone.
+        for rows in _chunks('thumbnails', chunk_size):
+            lists = [(key, deserialize(value)) for key, value in rows]
+            unknown = set()
+            for key, thumbnail_keys in lists:
+                unknown.update(k for k in [del_prefix(key)] + thumbnail_keys
+                               if k not in live)
+            new = self._stored_images(unknown - gone)
+            lost = []
+            for key, thumbnail_keys in lists:
+                if del_prefix(key) in new:
+                    continue
+                if del_prefix(key) not in live:
+                    lost.append(key)
+                    for thumbnail_key in thumbnail_keys:
+                        if live.pop(thumbnail_key, None) is not None:
+                            lost.append(add_prefix(thumbnail_key))
+                    continue
+                kept = [k for k in thumbnail_keys if k in live or k in new]
+                if len(kept) != len(thumbnail_keys):
+                    self._rewrite(key, kept)
+            self._delete_keys(lost)
+
+        # Thumbnail files that nothing refers to any more.  Files created
+        # since the walk started may belong to thumbnails being generated.
+        names = set(live.itervalues())
+        prefix = thumbnail_settings.THUMBNAIL_PREFIX
+        orphans = [name for name, mtime in files.iteritems()
+                   if name.startswith(prefix) and name not in names and
+                   mtime < started]
+        for name in orphans:
+            if self.verbosity > 1:
+                print "File %s" % name
+            if not self.dry_run:
+                try:
+                    os.remove(os.path.join(settings.MEDIA_ROOT, name))
+                except OSError:
+                    continue
+            self.deleted_files += 1
+
+        verb = 'Would delete' if self.dry_run else 'Deleted'
+        print "%s %d keys and %d files of %d in %.1fs" % (
+            verb, self.deleted_keys, self.deleted_files, len(files),
+            time.time() - started)
+
+    def _exists(self, name):
+        return os.path.exists(os.path.join(settings.MEDIA_ROOT, name))
+
+    def _stored_images(self, keys):
+        """The keys, without prefix, of those images which are stored."""
+        if not keys:
+            return set()
+        stored = (KVStoreModel.objects
+                  .filter(key__in=[add_prefix(key) for key in keys])
+                  .values_list('key', flat=True))
+        return set(del_prefix(key) for key in stored)
+
+    def _delete_keys(self, keys):
+        if not keys:
+            return
+        if self.verbosity > 1:
+            for key in keys:
+                print "Key %s" % key
+        self.deleted_keys += len(keys)
+        if self.dry_run:
+            return
+        KVStoreModel.objects.filter(key__in=keys).delete()
+        cache.delete_many(keys)
+
+    def _rewrite(self, key, thumbnail_keys):
+        if self.verbosity > 1:
+            print "Rewrite %s" % key
+        if self.dry_run:
+            return
+        value = serialize(thumbnail_keys)
+        KVStoreModel.objects.filter(key=key).update(value=value)
+        cache.set(key, value, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
@@ -0,0 +1,74 @@
+import datetime
+import heapq
+import time
+from optparse import make_option
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from airmozilla.main.models import _get_now
+from airmozilla.main.transitions import (apply_transition, run_transitions,
+                                         transitions)
+
+
+LAST_RUN_KEY = 'event_transitions_last_run'
+LAST_RUN_TIMEOUT = 60 * 60 * 24
+
+
+def _sleep_until(instant):
+    wait = instant - _get_now()
+    if wait > datetime.timedelta(0):
+        time.sleep(wait.days * 86400 + wait.seconds +
+                   wait.microseconds / 1e6)
+
+
+class Command(BaseCommand):
+    help = ('Invalidates cached pages as events go live, start and get '
+            'archived.  Run it from cron every minute, or with --daemon.')
+    option_list = BaseCommand.option_list + (
+        make_option('--since',
+            type='int',
+            dest='since',
+            default=5,
+            help='Minutes to look back when there is no record of the '
+                 'last run.'),
+        make_option('--daemon',
+            action='store_true',
+            dest='daemon',
+            default=False,
+            help='Keep running, sleeping until each transition.'),
+        make_option('--reload',
+            type='int',
+            dest='reload',
+            default=60,
+            help='Seconds between reloads of the upcoming transitions, '
+                 'with --daemon.'),
+    )
+
+    def handle(self, *args, **options):
+        since = cache.get(LAST_RUN_KEY)
+        if since is None:
+            since = _get_now() - datetime.timedelta(minutes=options['since'])
+        if not options['daemon']:
+            until = _get_now()
+            count = run_transitions(since, until)
+            cache.set(LAST_RUN_KEY, until, LAST_RUN_TIMEOUT)
+            if int(options['verbosity']) > 1:
+                print "Applied %d transitions" % count
+            return
+        reload = datetime.timedelta(seconds=options['reload'])
+        while True:
+            # Events edited since the last load are picked up on reload.
+            until = _get_now() + reload
+            heap = transitions(since, until)
+            while heap:
+                instant, id, public, transition = heapq.heappop(heap)
+                _sleep_until(instant)
+                apply_transition(public, transition)
+                since = instant
+                cache.set(LAST_RUN_KEY, since, LAST_RUN_TIMEOUT)
+                if int(options['verbosity']) > 1:
+                    print "%s: event %d %s" % (instant, id, transition)
+            _sleep_until(until)
+            since = until
+            cache.set(LAST_RUN_KEY, since, LAST_RUN_TIMEOUT)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from airmozilla.manage.badges import recount
+
+
+class Command(BaseCommand):
+    help = 'Recounts the manage badges from the database.'
+
+    def handle(self, *args, **options):
+        for name, value in sorted(recount().items()):
+            print "%s: %d" % (name, value)
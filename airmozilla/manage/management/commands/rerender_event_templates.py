@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from airmozilla.main.embed import rerender_events
+from airmozilla.main.models import Template
+
+
+class Command(BaseCommand):
+    help = 'Refreshes the pre-rendered video embed of every event.'
+
+    def handle(self, *args, **options):
+        for template in Template.objects.all():
+            count = rerender_events(template.event_set.all(), template)
+            print "Rendered %d events for template %s" % (count, template)
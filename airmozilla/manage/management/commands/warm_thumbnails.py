@@ -0,0 +1,134 @@
+import itertools
+import multiprocessing
+import time
+from optparse import make_option
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from sorl.thumbnail import default
+
+from airmozilla.main.models import Event, Participant
+from airmozilla.main.thumbnails import (GEOMETRIES, generate_missing,
+                                        image_fields, lookup_thumbnails,
+                                        thumbnail_specs)
+
+
+PROGRESS_KEY = 'warm_thumbnails_progress'
+PROGRESS_TIMEOUT = 60 * 60 * 24 * 7
+
+MODELS = (Event, Participant)
+
+
+def _forget_lost(specs):
+    """Drops the key value store entries of thumbnails whose file is gone,
+       so that they are generated again."""
+    for thumbnail in lookup_thumbnails(specs):
+        if thumbnail is not None and not thumbnail.exists():
+            default.kvstore.delete(thumbnail)
+
+
+def _warm(task):
+    """Generates the missing thumbnails of a chunk of images, in a worker
+       process.  Returns the last id, and the number of images, generated
+       thumbnails and bytes written."""
+    model_name, field, images, verify = task
+    geometries = GEOMETRIES[(model_name, field)]
+    generated = written = 0
+    for id, name in images:
+        specs = thumbnail_specs(name, geometries)
+        if verify:
+            _forget_lost(specs)
+        for thumbnail in generate_missing(specs):
+            generated += 1
+            written += default.storage.size(thumbnail.name)
+    return images[-1][0], len(images), generated, written
+
+
+class Command(BaseCommand):
+    help = ('Generates the missing thumbnails of every event and '
+            'participant image.  Interrupted runs resume where they '
+            'stopped.')
+    option_list = BaseCommand.option_list + (
+        make_option('--processes',
+            type='int',
+            dest='processes',
+            default=multiprocessing.cpu_count(),
+            help='Number of worker processes; with 1, thumbnails are '
+                 'generated in this process.'),
+        make_option('--batch-size',
+            type='int',
+            dest='batch_size',
+            default=20,
+            help='Number of images handed to a worker at a time.'),
+        make_option('--verify',
+            action='store_true',
+            dest='verify',
+            default=False,
+            help='Also regenerate thumbnails whose file is missing, e.g. '
+                 'after a storage migration.'),
+        make_option('--restart',
+            action='store_true',
+            dest='restart',
+            default=False,
+            help='Start over instead of resuming the previous run.'),
+    )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        progress = {}
+        if not options['restart']:
+            progress = cache.get(PROGRESS_KEY) or {}
+        pool = None
+        imap = itertools.imap
+        if options['processes'] > 1:
+            # Worker processes must not share the connections of this one.
+            connection.close()
+            if hasattr(cache, 'close'):
+                cache.close()
+            pool = multiprocessing.Pool(options['processes'])
+            imap = pool.imap
+        started = time.time()
+        images = generated = written = 0
+        try:
+            for model in MODELS:
+                for field in sorted(image_fields(model)):
+                    name = '%s.%s' % (model._meta.module_name, field)
+                    todo = list(
+                        model.objects
+                        .filter(id__gt=progress.get(name, 0))
+                        .exclude(**{field: ''})
+                        .order_by('id')
+                        .values_list('id', field)
+                    )
+                    tasks = [
+                        (model._meta.module_name, field,
+                         todo[i:i + batch_size], options['verify'])
+                        for i in range(0, len(todo), batch_size)
+                    ]
+                    done = 0
+                    for last_id, count, thumbnails, size in imap(_warm,
+                                                                 tasks):
+                        done += count
+                        images += count
+                        generated += thumbnails
+                        written += size
+                        progress[name] = last_id
+                        cache.set(PROGRESS_KEY, progress, PROGRESS_TIMEOUT)
+                        print "%s: %d/%d images" % (name, done, len(todo))
+            if pool is not None:
+                pool.close()
+        except:
+            if pool is not None:
+                pool.terminate()
+            raise
+        finally:
+            if pool is not None:
+                pool.join()
+        cache.delete(PROGRESS_KEY)
+        elapsed = time.time() - started
+        print "Generated %d thumbnails for %d images in %.1fs" % (
+            generated, images, elapsed)
+        print "%.1f images/sec, %d bytes written" % (
+            images / elapsed if elapsed else 0, written)
@@ -0,0 +1,104 @@
+from django.db import models
+from django.dispatch import receiver
+
+from airmozilla.main.models import Approval, Event, Participant
+from airmozilla.manage import badges
+
+
+def _initiated(event_ids):
+    return set(Event.objects.initiated().filter(id__in=event_ids)
+                                        .values_list('id', flat=True))
+
+
+@receiver(models.signals.pre_save, sender=Event)
+@receiver(models.signals.pre_delete, sender=Event)
+def event_badge_before(sender, instance, raw=False, **kwargs):
+    if not raw and instance.id:
+        instance._badge_initiated = _initiated([instance.id])
+
+
+@receiver(models.signals.post_save, sender=Event)
+def event_badge_after(sender, instance, raw, **kwargs):
+    if raw:
+        badges.forget('events')
+        return
+    before = getattr(instance, '_badge_initiated', set())
+    badges.adjust('events', len(_initiated([instance.id])) - len(before))
+
+
+@receiver(models.signals.post_delete, sender=Event)
+def event_badge_deleted(sender, instance, **kwargs):
+    badges.adjust('events', -len(getattr(instance, '_badge_initiated', ())))
+
+
+@receiver(models.signals.pre_save, sender=Approval)
+@receiver(models.signals.pre_delete, sender=Approval)
+def approval_badge_before(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    event_ids = [instance.event_id]
+    instance._badge_group = None
+    if instance.id:
+        old = (Approval.objects.filter(id=instance.id)
+                               .values_list('event', 'group', 'processed'))
+        for event_id, group_id, processed in old:
+            event_ids.append(event_id)
+            if not processed:
+                instance._badge_group = group_id
+    instance._badge_event_ids = set(event_ids)
+    instance._badge_initiated = _initiated(event_ids)
+
+
+def _approval_badge_update(instance, existing_event_ids):
+    if instance._badge_group is not None:
+        badges.adjust(badges.approvals_name(instance._badge_group), -1)
+    before = set(e for e in instance._badge_initiated
+                 if e in existing_event_ids)
+    badges.adjust('events',
+                  len(_initiated(existing_event_ids)) - len(before))
+
+
+@receiver(models.signals.post_save, sender=Approval)
+def approval_badge_after(sender, instance, raw, **kwargs):
+    if raw:
+        badges.forget('events')
+        if instance.group_id:
+            badges.forget(badges.approvals_name(instance.group_id))
+        return
+    if instance.group_id and not instance.processed:
+        badges.adjust(badges.approvals_name(instance.group_id), 1)
+    _approval_badge_update(instance, instance._badge_event_ids)
+
+
+@receiver(models.signals.post_delete, sender=Approval)
+def approval_badge_deleted(sender, instance, **kwargs):
+    # When the event itself is being deleted, its own receiver updates
+    # the events count.
+    existing = set(Event.objects.filter(id__in=instance._badge_event_ids)
+                                .values_list('id', flat=True))
+    _approval_badge_update(instance, existing)
+
+
+@receiver(models.signals.pre_save, sender=Participant)
+@receiver(models.signals.pre_delete, sender=Participant)
+def participant_badge_before(sender, instance, raw=False, **kwargs):
+    instance._badge_uncleared = bool(
+        not raw and instance.id and
+        Participant.objects.filter(id=instance.id,
+                                   cleared=Participant.CLEARED_NO).exists()
+    )
+
+
+@receiver(models.signals.post_save, sender=Participant)
+def participant_badge_after(sender, instance, raw, **kwargs):
+    if raw:
+        badges.forget('participants')
+        return
+    uncleared = instance.cleared == Participant.CLEARED_NO
+    badges.adjust('participants', int(uncleared) -
+                  int(instance._badge_uncleared))
+
+
+@receiver(models.signals.post_delete, sender=Participant)
+def participant_badge_deleted(sender, instance, **kwargs):
+    badges.adjust('participants', -int(instance._badge_uncleared))
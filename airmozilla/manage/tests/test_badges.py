@@ -0,0 +1,65 @@
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.test import TestCase
+
+from nose.tools import eq_
+
+from airmozilla.main.models import Approval, Event, Participant
+from airmozilla.manage import badges
+
+
+class TestBadgeCounts(TestCase):
+    fixtures = ['airmozilla/manage/tests/main_testdata.json']
+
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(name='testapprover')
+        self.names = ['events', 'participants',
+                      badges.approvals_name(self.group.id)]
+        badges.get_counts(self.names)
+
+    def _check(self):
+        cached = badges.get_counts(self.names)
+        eq_(cached, dict((name, badges.count(name)) for name in self.names))
+        return cached
+
+    def test_cached(self):
+        with self.assertNumQueries(0):
+            badges.get_counts(self.names)
+
+    def test_approvals(self):
+        """Counts follow approvals being requested, processed and
+           removed."""
+        event = Event.objects.get(id=22)
+        approval = Approval.objects.create(event=event, group=self.group)
+        eq_(self._check()['events'], 1)
+        eq_(self._check()[badges.approvals_name(self.group.id)], 1)
+        approval.processed = True
+        approval.approved = True
+        approval.save()
+        eq_(self._check()['events'], 0)
+        approval.delete()
+        eq_(self._check()[badges.approvals_name(self.group.id)], 0)
+
+    def test_events(self):
+        event = Event.objects.get(id=22)
+        event.status = Event.STATUS_INITIATED
+        event.save()
+        eq_(self._check()['events'], 1)
+        Approval.objects.create(event=event, group=self.group)
+        event.delete()
+        eq_(self._check()['events'], 0)
+        eq_(self._check()[badges.approvals_name(self.group.id)], 0)
+
+    def test_participants(self):
+        participant = Participant.objects.get(id=1)
+        participant.cleared = Participant.CLEARED_NO
+        participant.save()
+        count = self._check()['participants']
+        participant.delete()
+        eq_(self._check()['participants'], count - 1)
+
+    def test_recount(self):
+        cache.set('badge_count:events', 42)
+        eq_(badges.recount()['events'], 0)
+        self._check()
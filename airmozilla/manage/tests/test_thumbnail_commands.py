@@ -0,0 +1,197 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+
+import mock
+from nose.tools import eq_, ok_
+from sorl.thumbnail import delete
+from sorl.thumbnail.helpers import deserialize, serialize
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from airmozilla.main.models import Event, Participant
+from airmozilla.main.thumbnails import (GEOMETRIES, lookup_thumbnails,
+                                        thumbnail_specs)
+from airmozilla.manage.management.commands.cleanup_thumbnails import (
+    FILE_STORAGE)
+from airmozilla.manage.management.commands.warm_thumbnails import (
+    PROGRESS_KEY)
+
+
+def save_image():
+    with open('airmozilla/manage/tests/firefox.png', 'rb') as fp:
+        return default_storage.save('tests/firefox.png', File(fp))
+
+
+class WarmThumbnailsTests(TestCase):
+    fixtures = ['airmozilla/manage/tests/main_testdata.json']
+
+    def setUp(self):
+        cache.clear()
+        Event.objects.update(placeholder_img='')
+        Participant.objects.all().delete()
+        self.images = []
+        self.participants = []
+        for i in range(2):
+            participant = Participant.objects.create(
+                name='Participant %d' % i,
+                slug='participant-%d' % i,
+                role=Participant.ROLE_PRESENTER
+            )
+            # Set with update() so that saving does not generate the
+            # thumbnails.
+            image = save_image()
+            Participant.objects.filter(id=participant.id).update(photo=image)
+            self.images.append(image)
+            self.participants.append(participant)
+
+    def tearDown(self):
+        for image in self.images:
+            delete(image)
+
+    def _thumbnails(self, image):
+        specs = thumbnail_specs(image, GEOMETRIES[('participant', 'photo')])
+        return lookup_thumbnails(specs)
+
+    def _warm(self, **options):
+        call_command('warm_thumbnails', processes=1, **options)
+
+    def test_generates_missing(self):
+        for image in self.images:
+            eq_(self._thumbnails(image), [None, None])
+        self._warm()
+        for image in self.images:
+            thumbnails = self._thumbnails(image)
+            ok_(all(thumbnails))
+            ok_(all(thumbnail.exists() for thumbnail in thumbnails))
+        eq_(cache.get(PROGRESS_KEY), None)
+
+    def test_resumes(self):
+        """An interrupted run starts after the last image it did."""
+        cache.set(PROGRESS_KEY,
+                  {'participant.photo': self.participants[0].id})
+        self._warm()
+        eq_(self._thumbnails(self.images[0]), [None, None])
+        ok_(all(self._thumbnails(self.images[1])))
+
+    def test_verify(self):
+        """--verify regenerates thumbnails whose file was deleted."""
+        self._warm()
+        thumbnail = self._thumbnails(self.images[0])[0]
+        default_storage.delete(thumbnail.name)
+        self._warm()
+        ok_(not default_storage.exists(thumbnail.name))
+        self._warm(verify=True)
+        ok_(default_storage.exists(thumbnail.name))
+
+
+class CleanupThumbnailsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        # Files older than the run, so that unreferenced ones may go.
+        self.old = time.time() - 60
+
+    def tearDown(self):
+        shutil.rmtree(self.media_root)
+
+    def _file(self, name, mtime=None):
+        path = os.path.join(self.media_root, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        open(path, 'w').close()
+        mtime = mtime or self.old
+        os.utime(path, (mtime, mtime))
+
+    def _image(self, key, name):
+        value = serialize({'name': name, 'storage': FILE_STORAGE,
+                           'size': [32, 32]})
+        KVStoreModel.objects.create(key=add_prefix(key), value=value)
+
+    def _thumbnails(self, key, thumbnail_keys):
+        KVStoreModel.objects.create(key=add_prefix(key, 'thumbnails'),
+                                    value=serialize(thumbnail_keys))
+
+    def _keys(self):
+        return set(KVStoreModel.objects.values_list('key', flat=True))
+
+    def _cleanup(self, **options):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            call_command('cleanup_thumbnails', threads=1, **options)
+
+    def test_lost_image(self):
+        """An image whose file is gone goes with its thumbnails."""
+        self._image('source', 'uploads/source.png')
+        self._image('thumbnail', 'cache/aa/thumbnail.png')
+        self._file('cache/aa/thumbnail.png')
+        self._thumbnails('source', ['thumbnail'])
+        self._cleanup()
+        eq_(self._keys(), set())
+        ok_(not os.path.exists(
+            os.path.join(self.media_root, 'cache/aa/thumbnail.png')))
+
+    def test_missing_thumbnail(self):
+        """Thumbnail lists forget the thumbnails whose file is gone."""
+        self._image('source', 'uploads/source.png')
+        self._file('uploads/source.png')
+        self._image('kept', 'cache/aa/kept.png')
+        self._file('cache/aa/kept.png')
+        self._image('lost', 'cache/bb/lost.png')
+        self._thumbnails('source', ['kept', 'lost'])
+        self._cleanup()
+        eq_(self._keys(), set([add_prefix('source'), add_prefix('kept'),
+                               add_prefix('source', 'thumbnails')]))
+        value = KVStoreModel.objects.get(
+            key=add_prefix('source', 'thumbnails')).value
+        eq_(deserialize(value), ['kept'])
+
+    def test_created_during_walk(self):
+        """A thumbnail stored after the walk went past its file is kept."""
+        self._image('source', 'uploads/source.png')
+        self._file('uploads/source.png')
+        self._image('thumbnail', 'cache/aa/thumbnail.png')
+        self._file('cache/aa/thumbnail.png')
+        self._thumbnails('source', ['thumbnail'])
+        keys = self._keys()
+        with mock.patch('airmozilla.manage.management.commands.'
+                        'cleanup_thumbnails.media_files',
+                        return_value={'uploads/source.png': self.old}):
+            self._cleanup()
+        eq_(self._keys(), keys)
+        ok_(os.path.exists(os.path.join(self.media_root,
+                                        'cache/aa/thumbnail.png')))
+
+    def test_orphan_files(self):
+        """Unreferenced thumbnail files are deleted, unless they are newer
+           than the run and may belong to a thumbnail being generated."""
+        self._file('uploads/source.png')
+        self._file('cache/aa/orphan.png')
+        self._file('cache/bb/new.png', mtime=time.time() + 60)
+        self._cleanup()
+        ok_(os.path.exists(os.path.join(self.media_root,
+                                        'uploads/source.png')))
+        ok_(not os.path.exists(os.path.join(self.media_root,
+                                            'cache/aa/orphan.png')))
+        ok_(os.path.exists(os.path.join(self.media_root,
+                                        'cache/bb/new.png')))
+
+    def test_dry_run(self):
+        self._image('source', 'uploads/source.png')
+        self._image('thumbnail', 'cache/aa/thumbnail.png')
+        self._thumbnails('source', ['thumbnail', 'lost'])
+        self._file('cache/aa/thumbnail.png')
+        self._file('cache/bb/orphan.png')
+        keys = self._keys()
+        self._cleanup(dry_run=True)
+        eq_(self._keys(), keys)
+        for name in ('cache/aa/thumbnail.png', 'cache/bb/orphan.png'):
+            ok_(os.path.exists(os.path.join(self.media_root, name)))
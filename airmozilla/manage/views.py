@@ -17,7 +17,8 @@ from django.utils import timezone
 from funfactory.urlresolvers import reverse
 from jinja2 import Environment, meta
 
-from airmozilla.base.utils import json_view, paginate, tz_apply
+from airmozilla.base.utils import (estimated_count, json_view, paginate,
+                                   tz_apply)
 from airmozilla.main.models import (Approval, Category, Event, Location,
                                     Participant, Tag, Template)
 from airmozilla.manage import forms
@@ -62,7 +63,8 @@ def users(request):
             return redirect('manage:user_edit', user.id)
     else:
         form = forms.UserFindForm()
-    users_paged = paginate(User.objects.all(), request.GET.get('page'), 10)
+    users_paged = paginate(User.objects.all(), request.GET.get('page'), 10,
+                           count_provider=estimated_count)
     return render(request, 'manage/users.html',
                   {'paginate': users_paged, 'form': form})
 
@@ -252,25 +254,19 @@ def events(request):
             ).order_by('-start_time')
     else:
         search_form = forms.EventFindForm()
-    initiated = (Event.objects.initiated().filter(**creator_filter)
-                 .order_by('start_time')
-                 .select_related('category', 'location'))
-    upcoming = (Event.objects.upcoming().filter(**creator_filter)
-                .order_by('start_time').select_related('category', 'location'))
-    live = (Event.objects.live().filter(**creator_filter)
-            .order_by('start_time').select_related('category', 'location'))
-    archiving = (Event.objects.archiving().filter(**creator_filter)
-                 .order_by('-archive_time')
-                 .select_related('category', 'location'))
     archived = (Event.objects.archived_and_removed().filter(**creator_filter)
                 .order_by('-start_time')
                 .select_related('category', 'location'))
     archived_paged = paginate(archived, request.GET.get('page'), 10)
+    # The other lists only show on the first page.
+    states = dict((state, []) for state in Event.LIFECYCLE_STATES)
+    if archived_paged.number == 1 and not search_results:
+        states = Event.objects.by_lifecycle_state(**creator_filter)
     return render(request, 'manage/events.html', {
-        'initiated': initiated,
-        'upcoming': upcoming,
-        'live': live,
-        'archiving': archiving,
+        'initiated': states[Event.LIFECYCLE_INITIATED],
+        'upcoming': states[Event.LIFECYCLE_UPCOMING],
+        'live': states[Event.LIFECYCLE_LIVE],
+        'archiving': states[Event.LIFECYCLE_ARCHIVING],
         'archived': archived_paged,
         'form': search_form,
         'search_results': search_results
@@ -58,6 +58,17 @@ TEMPLATE_CONTEXT_PROCESSORS += (
 # Always generate a CSRF token for anonymous users.
 ANON_ALWAYS = True
 
+# Adds the {% cache %} fragment cache tag to the Jinja environment.
+_JINJA_CONFIG = JINJA_CONFIG
+
+
+def JINJA_CONFIG():
+    config = _JINJA_CONFIG()
+    config['extensions'] = list(config['extensions']) + [
+        '%s.base.extensions.FragmentCacheExtension' % PROJECT_MODULE
+    ]
+    return config
+
 # Tells the extract script what files to look for L10n in and what function
 # handles the extraction. The Tower library expects this.
 DOMAIN_METHODS['messages'] = [
@@ -89,6 +100,9 @@ MIDDLEWARE_CLASSES = list(MIDDLEWARE_CLASSES)
 MIDDLEWARE_CLASSES.remove('funfactory.middleware.LocaleURLMiddleware')
 MIDDLEWARE_CLASSES.insert(0, 'airmozilla.locale_middleware.' +
                              'LocaleURLMiddleware')
+# First, so that it sees the response last.
+MIDDLEWARE_CLASSES.insert(0, 'airmozilla.base.middleware.' +
+                             'KVStoreFlushMiddleware')
 MIDDLEWARE_CLASSES = tuple(MIDDLEWARE_CLASSES)
 
 # Enable timezone support for Django TZ-aware datetime objects
@@ -108,11 +122,88 @@ ARCHIVING_MARGIN = 60
 # and half from the future) will be output.
 CALENDAR_SIZE = 30
 
+# How long, in seconds, each event's serialized calendar entry is cached
+CALENDAR_FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+# Calendars requested with a date range or filters: how many days before
+# today they start by default, the longest range served, in days, and how
+# long each month of events is cached, in seconds.
+CALENDAR_RANGE_DAYS = 30
+CALENDAR_MAX_RANGE_DAYS = 366
+CALENDAR_MONTH_CACHE_TIMEOUT = 60 * 60
+
+# How long, in seconds, the last change of each feed is remembered; when
+# it is forgotten, feeds are served as changed from then on.
+CALENDAR_CHANGED_TIMEOUT = 60 * 60 * 24 * 365
+
+# How many compiled event video templates each worker keeps in memory
+COMPILED_TEMPLATE_CACHE_SIZE = 100
+
+# How many events are re-rendered per batch after a template is edited,
+# and the number of threads per process doing it; with 0 they are
+# re-rendered during the save.
+EMBED_RERENDER_BATCH_SIZE = 100
+EMBED_RERENDER_WORKERS = 1
+
+# How long, in seconds, event slug lookups are cached; unknown slugs are
+# only cached briefly so that newly created events show up quickly.
+SLUG_CACHE_TIMEOUT = 60 * 60 * 24
+SLUG_CACHE_MISS_TIMEOUT = 60
+
+# How long, in seconds, the data of an event page is cached
+EVENT_BUNDLE_CACHE_TIMEOUT = 60 * 60
+
+# How long, in seconds, the manage badge counts are cached.  They are
+# kept up to date as things change and reconciled by recount_badges.
+BADGE_COUNT_TIMEOUT = 60 * 60 * 24
+
+# How long, in seconds, generation numbers are kept in the cache.  Things
+# cached against a generation expire with it at the latest.
+CACHE_GENERATION_TIMEOUT = 60 * 60 * 24 * 30
+
+# How long, in seconds, paginated listing counts are cached; they are
+# recounted sooner when a table they read from changes.  Tables with at
+# least PAGINATE_ESTIMATE_MIN_ROWS rows may be counted from the database
+# statistics instead, where a listing asks for an estimate.
+PAGINATE_COUNT_TIMEOUT = 60 * 60
+PAGINATE_ESTIMATE_MIN_ROWS = 100000
+
+# Longest time, in seconds, public pages are cached for anonymous
+# visitors; they are dropped sooner when what they show changes.
+PAGE_CACHE_TIMEOUT = 60 * 10
+
+# How long, in seconds, template fragments are cached by default with
+# {% cache %}.  Fragment keys include what the fragment shows, such as the
+# event modification time, so they need no invalidation.
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
 # Use PNG for thumbnailing
 THUMBNAIL_FORMAT = 'PNG'
 
+# Thumbnail references are written to the database in bulk at the end of
+# each request, and can be read many at a time.
+THUMBNAIL_KVSTORE = 'airmozilla.base.kvstore.KVStore'
+
+# Decode JPEG images at the smallest scale the thumbnail allows, and refuse
+# to thumbnail images larger than this many pixels once decoded.
+THUMBNAIL_ENGINE = 'airmozilla.base.thumbnail_engine.Engine'
+THUMBNAIL_MAX_PIXELS = 50 * 1000 * 1000
+
+# Number of threads per process generating the thumbnails of newly saved
+# images; with 0 they are generated during the save.
+THUMBNAIL_PREGENERATE_WORKERS = 2
+
+# Number of archived events per home page, and the longest time, in
+# seconds, the index of home page boundaries is cached.
+HOME_PAGE_SIZE = 10
+HOME_PAGE_INDEX_TIMEOUT = 60 * 60
+
 # Number of upcoming events to display in the sidebar
 UPCOMING_SIDEBAR_COUNT = 3
 
+# Longest time, in seconds, the sidebar events are cached; they are
+# refreshed sooner when events change or the next upcoming one goes live.
+SIDEBAR_CACHE_TIMEOUT = 60 * 60
+
 # Use memcached for session storage
 SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
@@ -1,3 +1,9 @@
 # These settings will always be overriding for all test runs
 
 EMAIL_FROM_ADDRESS = 'doesnt@matter.com'
+
+# Generate thumbnails and re-render embeds during the save: worker threads
+# would write over their own connections, outside of the test
+# transactions.
+THUMBNAIL_PREGENERATE_WORKERS = 0
+EMBED_RERENDER_WORKERS = 0